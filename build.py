@@ -1,15 +1,18 @@
 from core.api import Api
 from core.dblite import DBLite, dict_factory
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Set
 from core.types import ParamValueText, QueryCentros
-from core.util import must_one, read_file, tp_join, logme, parse_dir, unupper
+from core.util import must_one, read_file, tp_join, logme, parse_dir, unupper, get_leaves
 from core.centro import Centro, SEP
 from core.colegio import Colegio, BulkRequestsColegio
 from core.bulkrequests import BulkRequests
 from core.filemanager import FM
 import argparse
+from collections import defaultdict
+from os.path import isfile
+import os
 import logging
-from core.concurso import Concurso, Concursazo, Concursillo
+from core.concurso import Concurso, Concursazo, Concursillo, load_anexos
 import re
 from core.geo import GEO
 from core.opendata import OpenData
@@ -24,6 +27,9 @@ parser.add_argument(
 parser.add_argument(
     '--db', type=str, default="out/db.sqlite"
 )
+parser.add_argument(
+    '--sync', action='store_true', help="Construye la db aparte y en --db solo escribe las filas que cambian (en vez de borrarla y crearla de cero)"
+)
 
 ARG = parser.parse_args()
 API = Api()
@@ -106,6 +112,13 @@ def build_db(db: DBLite, tcp_limit: int = 10):
 
     insert_concurso(db)
     auto_fix(db)
+    create_indexes(db)
+
+
+@logme
+def create_indexes(db: DBLite):
+    # Se crean al final para no mantenerlos durante la carga
+    db.execute("sql/index.sql")
 
 
 @logme
@@ -203,33 +216,61 @@ def insert_queries(db: DBLite):
 
 @logme
 def insert_etapas(db: DBLite):
-    for e in walk_etapas():
-        db.insert("ETAPA", id=e.id, txt=e.txt)
-        for c in e.centros:
-            db.insert("ETAPA_CENTRO", etapa=e.id, centro=c)
-    for e in walk_etapas():
-        for c in e.centros:
-            eid = e.id.split("/")
-            while len(eid) > 1:
-                eid.pop()
-                etp = "/".join(eid)
-                txt = SEP.join(e.txt.split(SEP)[:len(eid)])
-                db.insert("ETAPA", id=etp, txt=txt, _or="ignore")
-                db.insert(
-                    "ETAPA_CENTRO",
-                    centro=c,
-                    etapa=etp,
-                    inferido=1,
-                    _or="ignore"
-                )
+    txt: Dict[str, str] = {}
+    # etapa -> centros que salen al buscar por ella
+    own: Dict[str, Set[int]] = {}
+    # etapa -> centros que salen al buscar por alguna de sus subetapas
+    sub: Dict[str, Set[int]] = defaultdict(set)
+    etapas = tuple(walk_etapas())
+    for e in etapas:
+        txt[e.id] = e.txt
+        own[e.id] = set(e.centros)
+    # Etapas padre que no tienen centros propios
+    for e in etapas:
+        eid = e.id.split("/")
+        for i in reversed(range(1, len(eid))):
+            etp = "/".join(eid[:i])
+            txt.setdefault(etp, SEP.join(e.txt.split(SEP)[:i]))
+    # De las hojas a la raíz, cada padre hereda los centros de sus hijos
+    for etp in sorted(txt.keys(), key=lambda x: x.count("/"), reverse=True):
+        if "/" not in etp:
+            continue
+        parent = etp.rsplit("/", 1)[0]
+        sub[parent].update(own.get(etp, set()), sub[etp])
+
+    # centro -> etapa -> inferido
+    etapa_centro: Dict[int, Dict[str, int]] = defaultdict(dict)
+    for etp in txt.keys():
+        for c in sub[etp]:
+            etapa_centro[c][etp] = 1
+        for c in own.get(etp, set()):
+            etapa_centro[c][etp] = 0
+
+    def iter_etapa_centro():
+        # Una etapa es hoja si el centro no tiene ninguna de sus subetapas
+        for c, etps in sorted(etapa_centro.items()):
+            hojas = get_leaves(etps.keys(), "/")
+            for etp, inferido in sorted(etps.items()):
+                yield c, etp, inferido, int(etp in hojas)
+
+    db.insert_many("ETAPA", ("id", "txt"), txt.items())
+    db.insert_many(
+        "ETAPA_CENTRO",
+        ("centro", "etapa", "inferido", "hoja"),
+        iter_etapa_centro()
+    )
 
     for c in API.search_centros():
         if c.isBad():
             continue
+        hojas = get_leaves((e.nombre for e in c.etapas if e.nombre), " -> ")
         for e in c.etapas:
-            db.insert("ETAPA_NOMBRE_CENTRO", centro=c.id, **e._asdict())
-
-    db.execute("sql/fix/etapa.sql")
+            db.insert(
+                "ETAPA_NOMBRE_CENTRO",
+                centro=c.id,
+                hoja=int(e.nombre in hojas),
+                **e._asdict()
+            )
 
 
 @logme
@@ -494,7 +535,9 @@ def insert_concurso(db: DBLite):
     re_esp_dif = re.compile(r"centros? de especial dificultad", re.IGNORECASE)
     esp_dif = set()
     ok_cent = set(db.to_tuple("select id from centro"))
-    for con in map(Concurso.build, (Concursazo.MAESTROS, Concursazo.PROFESORES, Concursillo.MAESTROS, Concursillo.PROFESORES)):
+    concursos = tuple(map(Concurso.build, (Concursazo.MAESTROS, Concursazo.PROFESORES, Concursillo.MAESTROS, Concursillo.PROFESORES)))
+    load_anexos(*(anx for con in concursos for anx in con.anexos.values()))
+    for con in concursos:
         db.insert(
             "CONCURSO",
             convocatoria=con.convocatoria,
@@ -626,8 +669,31 @@ def auto_fix(db: DBLite):
     FM.dump(file, "\n".join(sql).strip())
 
 
+def build_and_sync(file: str, tcp_limit: int = 10):
+    """
+    Construye la db entera en un fichero temporal y luego solo escribe
+    en file las filas que cambian (así file no se queda a medias si la
+    build falla y sus lectores solo ven una transacción).
+    No ahorra trabajo: es la build completa más el diff de cada tabla
+    """
+    tmp = file + ".build"
+    with DBLite(tmp, reload=True) as db:
+        build_db(db, tcp_limit)
+    if not isfile(file):
+        os.replace(tmp, file)
+        return
+    try:
+        with DBLite(file) as db:
+            db.sync(tmp)
+    finally:
+        os.remove(tmp)
+
+
 if __name__ == "__main__":
-    with DBLite(ARG.db, reload=True) as db:
-        build_db(db, ARG.tcp_limit)
+    if ARG.sync:
+        build_and_sync(ARG.db, ARG.tcp_limit)
+    else:
+        with DBLite(ARG.db, reload=True) as db:
+            build_db(db, ARG.tcp_limit)
 
     DBLite.do_sql_backup(ARG.db)
@@ -1,32 +1,35 @@
 import re
 from functools import cache, cached_property
 from urllib.parse import urljoin
-from typing import Any, Coroutine, Tuple, Dict, List
+from typing import Any, Coroutine, Tuple, Dict, List, Iterable, Iterator, Set
 from aiohttp import ClientSession
 import requests
 from bs4 import BeautifulSoup, Tag
-from os.path import dirname, isfile
-from glob import glob
+from os.path import dirname
+from fnmatch import fnmatch
+import sqlite3
+import time
 import os
 import logging
 from requests.exceptions import ConnectionError
 from itertools import zip_longest
+from collections import defaultdict
 
 from .web import Web, Driver, buildSoup, select_attr, DomNotFoundException
 from .types import ParamValueText, QueryResponse
+from .idset import IdSet
 from .centro import Centro
 from .cache import Cache
 from .retry import retry
-from .bulkrequests import BulkRequestsFileJob
+from .bulkrequests import BulkRequestsJob
 from .util import hashme, fix_char
+from .filemanager import FM
 from .opendata import OpenData, CamCentro
 
 
 logger = logging.getLogger(__name__)
 
 re_location = re.compile(r"document.location.href=\s*[\"'](.*.csv)[\"']")
-re_csv_br = re.compile(r"\s*\n\s*")
-re_csv_fl = re.compile(r"\s*;\s*")
 re_sp = re.compile(r"\s+")
 
 JS_TIMEOUT = int(os.environ.get('JS_TIMEOUT', '600'))
@@ -99,27 +102,178 @@ class CsvCache(Cache):
         return "/".join(arr) + f".{self.ext}"
 
 
+def pack_ids(ids: Iterable[int]) -> bytes:
+    return IdSet(ids).tobytes()
+
+
+def unpack_ids(blob: bytes) -> IdSet:
+    return IdSet.frombytes(blob)
+
+
 class IdCache(CsvCache):
+    """
+    Guarda el resultado de cada búsqueda (query -> ids ordenados) en un
+    único sqlite ({file}/ids.sqlite) en lugar de un fichero por búsqueda.
+    Se carga entero en memoria la primera vez que se usa, por lo que
+    el resto de lecturas no tocan disco.
+    Los nombres de fichero de parse_file_name se siguen usando como clave.
+    """
+    DB = "ids.sqlite"
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, ext="txt", **kwargs)
+        self.__con: sqlite3.Connection = None
+        self.__data: Dict[str, Tuple[IdSet, float]] = None
+
+    @property
+    def root(self) -> str:
+        return self.file.rstrip("/")
+
+    def __key(self, file: str):
+        return file.removeprefix(self.root+"/").removesuffix("."+self.ext)
+
+    def __file(self, key: str):
+        return f"{self.root}/{key}.{self.ext}"
+
+    @property
+    def _data(self):
+        if self.__data is None:
+            self.__load()
+        return self.__data
+
+    def __load(self):
+        path = FM.resolve_path(f"{self.root}/{IdCache.DB}")
+        FM.makedirs(path)
+        is_new = not path.exists()
+        self.__con = sqlite3.connect(path)
+        self.__con.execute('''
+            CREATE TABLE IF NOT EXISTS IDS (
+                query TEXT NOT NULL PRIMARY KEY,
+                ids   BLOB NOT NULL,
+                mtime REAL NOT NULL
+            )
+        ''')
+        self.__data = {}
+        for key, blob, mtime in self.__con.execute("select query, ids, mtime from IDS"):
+            self.__data[key] = (unpack_ids(blob), mtime)
+        logger.debug(f"IdCache({path}) = {len(self.__data)} búsquedas")
+        if is_new:
+            self.__import_txt()
+
+    def __import_txt(self):
+        # Importa las búsquedas guardadas con el formato antiguo (un txt por búsqueda)
+        root = FM.resolve_path(self.root)
+        rows = []
+        for f in sorted(root.glob(f"**/*.{self.ext}")):
+            key = f.relative_to(root).as_posix().removesuffix("."+self.ext)
+            ids = map(int, FM.load_txt(f).strip().split())
+            rows.append((key, pack_ids(ids), f.stat().st_mtime))
+        if len(rows) == 0:
+            return
+        logger.info(f"IdCache importa {len(rows)} búsquedas de {root}")
+        self.__con.executemany(
+            "insert or replace into IDS (query, ids, mtime) values (?, ?, ?)",
+            rows
+        )
+        self.__con.commit()
+        for key, blob, mtime in rows:
+            self.__data[key] = (unpack_ids(blob), mtime)
+
+    def tooOld(self, fl):
+        if self.reload:
+            return True
+        item = self._data.get(self.__key(fl))
+        if item is None:
+            return True
+        if self.maxOld is None:
+            return False
+        return item[1] < self.maxOld
+
+    def exists(self, file: str):
+        return self.__key(file) in self._data
 
-    def read(self, *args, **kargs):
-        content: str = super().read(*args, **kargs)
-        ids = map(int, set(content.strip().split()))
-        return tuple(sorted(ids))
+    def glob(self, pattern: str) -> Tuple[str]:
+        deep = pattern.count("/")
+        files = map(self.__file, self._data.keys())
+        return tuple(sorted(
+            f for f in files if f.count("/") == deep and fnmatch(f, pattern)
+        ))
+
+    def read(self, file, *args, **kargs):
+        return self._data[self.__key(file)][0]
 
     def save(self, file, data, *args, **kargs):
-        data = "\n".join(map(str, sorted(set(data))))
-        super().save(file, data.strip(), *args, **kargs)
+        key = self.__key(file)
+        blob = pack_ids(data)
+        mtime = time.time()
+        self._data[key] = (unpack_ids(blob), mtime)
+        self.__con.execute(
+            "insert or replace into IDS (query, ids, mtime) values (?, ?, ?)",
+            (key, blob, mtime)
+        )
+        self.__con.commit()
+
+    def remove(self, file: str):
+        key = self.__key(file)
+        if self._data.pop(key, None) is None:
+            return
+        self.__con.execute("delete from IDS where query = ?", (key, ))
+        self.__con.commit()
+
+
+class IdOwnerIndex:
+    """
+    Indice en memoria id -> ficheros de IdCache en los que aparece,
+    para detectar conflictos entre búsquedas sin releer los ficheros
+    """
+
+    def __init__(self, id_cache: IdCache, pattern: str):
+        self.__owners: Dict[int, Set[str]] = defaultdict(set)
+        self.__ids: Dict[str, IdSet] = dict()
+        for f in id_cache.glob(pattern):
+            self.add(f, id_cache.read(f))
+
+    def __contains__(self, file: str):
+        return file in self.__ids
+
+    def get(self, file: str) -> IdSet:
+        return self.__ids.get(file)
+
+    def add(self, file: str, ids: IdSet):
+        self.remove(file)
+        self.__ids[file] = ids
+        for i in ids:
+            self.__owners[i].add(file)
+
+    def remove(self, file: str):
+        for i in self.__ids.pop(file, tuple()):
+            owners = self.__owners[i]
+            owners.discard(file)
+            if len(owners) == 0:
+                del self.__owners[i]
+
+    def conflicts(self, file: str, ids: IdSet) -> Dict[str, IdSet]:
+        ko: Dict[str, Set[int]] = defaultdict(set)
+        for i in ids:
+            for f in self.__owners.get(i, tuple()):
+                if f != file:
+                    ko[f].add(i)
+        return {f: IdSet(v) for f, v in sorted(ko.items())}
+
+
+def iter_csv_rows(lines: Iterable[str]) -> Iterator[Tuple[str, ...]]:
+    """
+    Recorre las filas de un csv de gestiona en una sola pasada
+    (sin expresiones regulares) a partir de sus lineas
+    """
+    for row in lines:
+        row = row.strip().rstrip(" ;,-")
+        if len(row) > 0:
+            yield tuple(c.strip() for c in row.split(";"))
 
 
 def csvstr_to_rows(content: str) -> Tuple[Tuple[str]]:
-    rows = []
-    for row in re_csv_br.split(content.strip()):
-        row = row.rstrip(" ;,-")
-        if len(row) > 0:
-            rows.append(tuple(re_csv_fl.split(row)))
-    return tuple(rows)
+    return tuple(iter_csv_rows(content.split("\n")))
 
 
 def csvstr_to_dict(content: str) -> Tuple[Dict[str, Any]]:
@@ -136,14 +290,21 @@ def csvstr_to_dict(content: str) -> Tuple[Dict[str, Any]]:
     return rows
 
 
-class BulkRequestsApi(BulkRequestsFileJob):
+class BulkRequestsApi(BulkRequestsJob):
+    CD_GENERICO: IdOwnerIndex = None
+
+    @classmethod
+    def prepare(cls, *jobs: "BulkRequestsApi"):
+        # El indice se reconstruye (una sola vez) en cada ejecución
+        cls.CD_GENERICO = None
+
     def __init__(self, api: "Api", data: Dict[str, str]):
         self.data = data
         self.api = api
-        self.id_cache: IdCache = getattr(self.api.search_ids, "__cache_obj__")
-        self.ids: Dict[Tuple[int], int] = dict()
+        self.id_cache: IdCache = getattr(self.api._search_ids, "__cache_obj__")
+        self.ids: Dict[IdSet, int] = dict()
 
-    def get_best(self) -> Tuple[int]:
+    def get_best(self) -> IdSet:
         if len(self.ids) == 0:
             return None
         ids, count = list(sorted(
@@ -172,34 +333,55 @@ class BulkRequestsApi(BulkRequestsFileJob):
     def done(self) -> bool:
         if self.__is_bad_cdGenerico():
             return False
-        return isfile(self.file)
+        return self.id_cache.exists(self.file)
 
-    def __is_bad_cdGenerico(self, ids: Tuple[int] = None):
-        if tuple(self.data.keys()) != ('cdGenerico', ):
+    def undo(self):
+        self.id_cache.remove(self.file)
+        self.api.clear_memo(**self.data)
+
+    def __is_cdGenerico(self):
+        return tuple(self.data.keys()) == ('cdGenerico', )
+
+    def __get_cdGenerico_index(self) -> IdOwnerIndex:
+        if BulkRequestsApi.CD_GENERICO is None:
+            BulkRequestsApi.CD_GENERICO = IdOwnerIndex(
+                self.id_cache,
+                self.id_cache.parse_file_name(cdGenerico='*')
+            )
+        return BulkRequestsApi.CD_GENERICO
+
+    def __is_bad_cdGenerico(self, ids: IdSet = None):
+        if not self.__is_cdGenerico():
             return False
-        if ids is None and isfile(self.file):
+        index = self.__get_cdGenerico_index()
+        if ids is None:
+            ids = index.get(self.file)
+        if ids is None and self.id_cache.exists(self.file):
             ids = self.id_cache.read(self.file)
+            index.add(self.file, ids)
         if ids is None or len(ids) == 0:
             return False
-        set_ids = set(ids)
-        bad_files = set()
-        for f in tuple(glob(self.id_cache.parse_file_name(cdGenerico='*'))):
-            if f == self.file:
-                continue
-            ko = tuple(sorted(set_ids.intersection(self.id_cache.read(f))))
-            if len(ko) > 0:
-                logger.error(f"Conflicto entre {self.file} y {f}: {ko}")
-                bad_files.add(f)
-        if bad_files:
-            for f in filter(isfile, bad_files.union((self.file,))):
-                os.remove(f)
-            return True
-        return False
+        bad_files = index.conflicts(self.file, ids)
+        if len(bad_files) == 0:
+            return False
+        for f, ko in bad_files.items():
+            logger.error(f"Conflicto entre {self.file} y {f}: {ko}")
+        for f in tuple(bad_files.keys()) + (self.file, ):
+            index.remove(f)
+            self.id_cache.remove(f)
+        self.api.clear_memo()
+        return True
+
+    def save(self, ids: IdSet):
+        self.id_cache.save(self.file, ids)
+        self.api.clear_memo(**self.data)
+        if self.__is_cdGenerico():
+            self.__get_cdGenerico_index().add(self.file, ids)
 
     async def do(self, session: ClientSession) -> Coroutine[Any, Any, bool]:
         async with session.post(self.url, data=self.data) as response:
             content = await response.text()
-            soup = buildSoup(self.url, content)
+            soup = buildSoup(self.url, content, urls=Api.SEARCH_URLS)
             try:
                 r = self.api._get_search_response(self.data, soup)
             except (ApiException, DomNotFoundException) as e:
@@ -212,7 +394,7 @@ class BulkRequestsApi(BulkRequestsFileJob):
             ids = self.get_best()
             if ids is None:
                 return False
-            self.id_cache.save(self.file, ids)
+            self.save(ids)
             return True
 
 
@@ -220,9 +402,31 @@ class Api():
     URL = "https://gestiona.comunidad.madrid/wpad_pub/run/j/BusquedaAvanzada.icm"
     DWN = "https://gestiona.comunidad.madrid/wpad_pub/run/j/ConsultaGeneralNPCentrosCSV.icm"
     FORM = "formBusquedaAvanzada"
+    # Únicas urls que se leen de la respuesta de una búsqueda
+    SEARCH_URLS = ("#frmExportarResultado", )
 
     def __init__(self):
         self.__centros = {}
+        self.__memo: Dict[Tuple, Any] = {}
+
+    def __memoize(self, func, **data):
+        key = (func.__name__, ) + tuple(sorted(data.items()))
+        if key not in self.__memo:
+            self.__memo[key] = func(**data)
+        return self.__memo[key]
+
+    def clear_memo(self, **data):
+        """
+        Olvida los resultados de search_ids y search_centros guardados en memoria,
+        todos o solo los de la búsqueda indicada
+        """
+        if len(data) == 0:
+            self.__memo.clear()
+            return
+        query = tuple(sorted(data.items()))
+        for k in tuple(self.__memo.keys()):
+            if k[1:] == query:
+                del self.__memo[k]
 
     @staticmethod
     def is_redundant_parameter(name: str):
@@ -246,14 +450,26 @@ class Api():
                 centros.append(self.__centros[id])
                 del ids[i]
         if len(ids) > 0:
-            content = self.get_csv_as_str(*ids)
-            for c in self.__parse_csv(content):
-                self.__centros[c.id] = c
-                centros.append(c)
+            with self.__open_csv(*ids) as f:
+                for c in self.__parse_csv(iter_csv_rows(f)):
+                    self.__centros[c.id] = c
+                    centros.append(c)
         centros = sorted(centros, key=lambda x: x.id)
         return tuple(centros)
 
-    def search_centros(self, **kargv):
+    def __open_csv(self, *ids: int):
+        csv_cache: CsvCache = getattr(self.get_csv_as_str, "__cache_obj__")
+        file = csv_cache.parse_file_name(*ids)
+        if csv_cache.tooOld(file):
+            self.get_csv_as_str(*ids)
+        else:
+            logger.log(csv_cache.loglevel, f"Cache.read({file})")
+        return open(FM.resolve_path(file), "r")
+
+    def search_centros(self, **kargv) -> Tuple[Centro]:
+        return self.__memoize(self._search_centros, **kargv)
+
+    def _search_centros(self, **kargv):
         ids = self.search_ids(**kargv)
         return self.get_centros(*ids)
 
@@ -262,8 +478,11 @@ class Api():
         r = requests.get("https://datos.comunidad.madrid/catalogo/dataset/c750856d-3166-4dac-8e80-d1b824c968b5/resource/28d60557-1d73-4281-ab08-6cfd3b2f5f83/download/centros_educativos.csv")
         return r.text
 
+    def search_ids(self, **data) -> IdSet:
+        return self.__memoize(self._search_ids, **data)
+
     @IdCache("cache/ids/", maxOld=5)
-    def search_ids(self, **data) -> Tuple[int]:
+    def _search_ids(self, **data) -> IdSet:
         r = self.__do_search(**data)
         return r.get_ids()
 
@@ -322,7 +541,11 @@ class Api():
         ids = tuple(sorted(ids))
         if endpoint is None:
             endpoint = Api.DWN
-        soup = WEB.get(endpoint, codCentrosExp=";".join(map(str, ids)))
+        soup = WEB.get(
+            endpoint,
+            urls=tuple(),
+            codCentrosExp=";".join(map(str, ids))
+        )
         url = self.__search_csv_url(soup)
         url = urljoin(endpoint, url)
         r = WEB._get(url)
@@ -367,20 +590,16 @@ class Api():
             if v != dom:
                 raise BadFormException(k, v, dom)
 
-    def __parse_csv(self, content: str) -> Tuple[Centro]:
-        rows = csvstr_to_rows(content)
-        if len(rows) <= 1:
+    def __parse_csv(self, rows: Iterable[Tuple[str, ...]]) -> Tuple[Centro]:
+        rows = iter(rows)
+        if next(rows, None) is None:
             return tuple()
-        arr = []
-        head = rows[1]
-        for row in rows[2:]:
-            c = self.__build_centro(head, row)
-            arr.append(c)
-        arr = tuple(arr)
-        return arr
-
-    def __build_centro(self, head: Tuple, row: Tuple):
-        c = Centro.build(head, row)
+        head = next(rows, None)
+        if head is None:
+            return tuple()
+        return tuple(map(self.__build_centro, Centro.iter_build(head, rows)))
+
+    def __build_centro(self, c: Centro):
         cam = OD.cam_centros.get(c.id)
         if cam is not None:
             c = c.replace(
@@ -420,6 +639,8 @@ class Api():
             if name not in form:
                 form[name] = {}
             form[name][val] = txt
+        # Con el formulario ya extraído no hace falta seguir guardando el html
+        self.__dict__.pop("home", None)
         return form
 
     @cache
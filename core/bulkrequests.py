@@ -23,6 +23,11 @@ class MissingBulkException(BulkException):
 
 class BulkRequestsJob(ABC):
 
+    @classmethod
+    def prepare(cls, *jobs: "BulkRequestsJob"):
+        """Se ejecuta una sola vez, con todos los trabajos de esta clase, al inicio de BulkRequests.run"""
+        pass
+
     @abstractproperty
     def url(self) -> str:
         pass
@@ -65,7 +70,7 @@ class BulkRequestsFileJob(BulkRequestsJob):
         return isfile(self.file)
 
     def undo(self):
-        if self.done():
+        if isfile(self.file):
             remove(self.file)
 
     async def do(self, session: ClientSession) -> bool:
@@ -115,6 +120,8 @@ class BulkRequests:
         if overwrite:
             for u in job:
                 u.undo()
+        for cls in set(map(type, job)):
+            cls.prepare(*(u for u in job if type(u) is cls))
         self.__run(*job, label=label)
 
     def __run(self, *job: BulkRequestsJob, label="items"):
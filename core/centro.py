@@ -1,23 +1,30 @@
-from dataclasses import dataclass, asdict, field, replace
+from dataclasses import dataclass, field, fields, replace
 from functools import cached_property, cache
-from typing import Dict, Tuple, NamedTuple, List
+from typing import Dict, Tuple, NamedTuple, List, Iterable, Set
 from aiohttp import ClientResponse, ClientSession
 from bs4 import BeautifulSoup, Tag
 from urllib import parse
 import math
+import os
+from hashlib import sha1
+from collections import defaultdict
+from os.path import isfile
+import asyncio
+import sqlite3
+import time
 from .web import Web, buildSoup, select_attr, DomNotFoundException
 from .cache import Cache
+from .filemanager import FM
 from .utm_to_geo import UTM_TO_GEO, LatLon
 from .retry import retry
 import re
 import logging
 from requests.exceptions import ConnectionError
 from .bulkrequests import BulkRequestsFileJob
-from itertools import zip_longest
 from .util import fix_char
-from unidecode import unidecode
 from core.geo import GEO
 from core.checker import MChecker, UChecker
+from .normalize import parse_key, parse_value, parse_telefono, parse_etapa_td
 
 re_sp = re.compile(r"\s+")
 re_coord = re.compile(r"&xIni=([\d\.]+)&yIni=([\d\.]+)")
@@ -45,108 +52,7 @@ def get_text(n: Tag):
 
 
 def get_etapa_td(n: Tag):
-    txt = get_text(n)
-    if txt is None:
-        return None
-    return {
-        "Clav e": "Clave"
-    }.get(txt, txt)
-
-
-def _parse_k(k: str):
-    if k == "CODIGO":
-        return "centro_codigo"
-    if k == "CENTRO":
-        return "centro_nombre"
-    if k == "COD_TIPO":
-        return "centro_tipo_codigo"
-    if k == "TIPO_ABRV":
-        return "centro_tipo_desc_abreviada"
-    if k == "TIPO_EXT":
-        return "centro_tipo_descripcion"
-    if k == "TITULARIDAD":
-        return "centro_titularidad"
-    if k == "TITULAR":
-        return "centro_titular"
-    if k == "NIF_TITULAR":
-        return "nif_titular"
-    if k == "NIF_CENTRO":
-        return "nif_centro"
-    if k == "COD_DAT":
-        return "dat_codigo"
-    if k == "DAT":
-        return "dat_nombre"
-    if k == "CDTPVIA":
-        return "direccion_via_tipo"
-    if k == "DOMICILIO":
-        return "direccion_via_nombre"
-    if k == "NMVIAL":
-        return "direccion_numero"
-    if k == "CDPOSTAL":
-        return "direccion_codigo_postal"
-    if k == "CDMUNI":
-        return "municipio_codigo"
-    if k == "MUNICIPIO":
-        return "municipio_nombre"
-    if k == "CDDISTRITO":
-        return "distrito_codigo"
-    if k == "DISTRITO":
-        return "distrito_nombre"
-    if k == "TELEFONO":
-        return "contacto_telefono1"
-    if k == "TELEFONO2":
-        return "contacto_telefono2"
-    if k == "TELEFONO3":
-        return "contacto_telefono3"
-    if k == "TELEFONO4":
-        return "contacto_telefono4"
-    if k == "E_MAIL":
-        return "contacto_email1"
-    if k == "E_MAIL2":
-        return "contacto_email2"
-    if k == "SITUACIÓN":
-        return "situacion"
-    if k == "FAX":
-        return "contacto_fax"
-    if k == "WEB":
-        return "contacto_web"
-    if k == "FECHA CONSTITUCIÓN":
-        return "fecha_constitucion"
-    if k == "UTM_X":
-        return "direccion_coor_x"
-    if k == "UTM_Y":
-        return "direccion_coor_y"
-    k = unidecode(k).lower()
-    return k
-
-
-def _parse(k: str, v: str):
-    if v is None:
-        return None
-    v = re_sp.sub(" ", v).strip()
-    lw = v.lower()
-    if lw.lower() in ("", "0", "http://", "https://", "http://no") or re.match(r"^-+$", lw):
-        return None
-    if k == 'FAX' and lw in ("sinfax", "nohayfax", "no", "x"):
-        return None
-    if k in ('centro_codigo', 'centro_tipo_codigo', 'dat_codigo', 'direccion_codigo_postal', 'distrito_codigo', 'direccion_coor_x', 'direccion_coor_y', 'CODIGO CENTRO', 'COD. POSTAL'):
-        return int(v)
-    if isinstance(v, str):
-        v = fix_char(v)
-    return v
-
-
-def _get_telefono(s: str) -> Tuple[int]:
-    if s is None:
-        return tuple()
-    s = s.replace(".", "")
-    s = re.sub(r"^\s*(00|\+)34\s*", "", s)
-    s = re_sp.sub(" ", s).strip()
-    arr = []
-    for t in s.split():
-        if len(t) > 8 and t not in arr and t.isdigit():
-            arr.append(int(t))
-    return tuple(arr)
+    return parse_etapa_td(get_text(n))
 
 
 def _parse_titularidad(t: str):
@@ -188,9 +94,97 @@ def get_etapa_level(td: Tag):
 
 
 class CentroHtmlCache(Cache):
+    """
+    Además de cada ficha, guarda en {file}/fingerprint.sqlite el
+    SoupCentro.content_fingerprint de cada una, cuándo cambió por última vez
+    (changed) y cuándo se comprobó por última vez (checked).
+    Una ficha que se vuelve a descargar sin cambios solo actualiza
+    checked, sin reescribir el html, y cuenta como recién descargada.
+    """
+    DB = "fingerprint.sqlite"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__con: sqlite3.Connection = None
+        self.__data: Dict[int, Tuple[str, float, float]] = None
+
     def parse_file_name(self, *args, slf: "Centro" = None, **kargv):
         return f"{self.file}/{slf.id}.html"
 
+    @property
+    def _data(self):
+        if self.__data is None:
+            self.__load()
+        return self.__data
+
+    def __load(self):
+        path = FM.resolve_path(f"{self.file.rstrip('/')}/{CentroHtmlCache.DB}")
+        FM.makedirs(path)
+        self.__con = sqlite3.connect(path)
+        self.__con.execute('''
+            CREATE TABLE IF NOT EXISTS FICHA (
+                id          INTEGER NOT NULL PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                changed     REAL NOT NULL,
+                checked     REAL NOT NULL
+            )
+        ''')
+        self.__data = {}
+        for id, fingerprint, changed, checked in self.__con.execute("select id, fingerprint, changed, checked from FICHA"):
+            self.__data[id] = (fingerprint, changed, checked)
+        logger.debug(f"CentroHtmlCache({path}) = {len(self.__data)} fichas")
+
+    @staticmethod
+    def __id(file: str):
+        return int(os.path.basename(file).rsplit(".", 1)[0])
+
+    def tooOld(self, fl):
+        if not os.path.isfile(fl):
+            return True
+        if self.reload:
+            return True
+        if self.maxOld is None:
+            return False
+        mtime = os.stat(fl).st_mtime
+        item = self._data.get(CentroHtmlCache.__id(fl))
+        if item is not None:
+            mtime = max(mtime, item[2])
+        return mtime < self.maxOld
+
+    def get_fingerprint(self, file: str) -> str:
+        item = self._data.get(CentroHtmlCache.__id(file))
+        if item is not None and os.path.isfile(file):
+            return item[0]
+        return None
+
+    def touch(self, file: str):
+        """Marca la ficha como comprobada ahora, sin reescribirla"""
+        id = CentroHtmlCache.__id(file)
+        fingerprint, changed, _ = self._data[id]
+        self.__put(id, fingerprint, changed, time.time())
+
+    def save(self, file, data, *args, **kwargs):
+        id = CentroHtmlCache.__id(file)
+        try:
+            fingerprint = SoupCentro(id, data).content_fingerprint
+        except (DomNotFoundException, CentroException):
+            super().save(file, data, *args, **kwargs)
+            return
+        if fingerprint == self.get_fingerprint(file):
+            self.touch(file)
+            return
+        super().save(file, data, *args, **kwargs)
+        now = time.time()
+        self.__put(id, fingerprint, now, now)
+
+    def __put(self, id: int, fingerprint: str, changed: float, checked: float):
+        self._data[id] = (fingerprint, changed, checked)
+        self.__con.execute(
+            "insert or replace into FICHA (id, fingerprint, changed, checked) values (?, ?, ?, ?)",
+            (id, fingerprint, changed, checked)
+        )
+        self.__con.commit()
+
 
 class CentroException(Exception):
     pass
@@ -222,31 +216,138 @@ class CountSoupCentro:
         return self.oderkey == other.oderkey
 
 
+class MapCache:
+    """
+    Guarda en un sqlite los mapas ya verificados, identificados por
+    (id del centro, BBOX del thumbnail, popup), para no volver a
+    consultar el WMS mientras la ficha no cambie y no tengan más
+    de maxOld días.
+    Solo se guardan las verificaciones correctas: un fallo puede ser
+    pasajero y se vuelve a comprobar en la siguiente ejecución.
+    """
+
+    def __init__(self, file: str, maxOld=30):
+        self.file = file
+        self.maxOld = time.time() - (maxOld * 86400)
+        self.__con: sqlite3.Connection = None
+        self.__data: Dict[Tuple[int, str, str], float] = None
+
+    @property
+    def _data(self):
+        if self.__data is None:
+            self.__load()
+        return self.__data
+
+    def __load(self):
+        path = FM.resolve_path(self.file)
+        FM.makedirs(path)
+        self.__con = sqlite3.connect(path)
+        self.__con.execute('''
+            CREATE TABLE IF NOT EXISTS MAP (
+                id    INTEGER NOT NULL,
+                bbox  TEXT NOT NULL,
+                popup TEXT NOT NULL,
+                mtime REAL NOT NULL,
+                PRIMARY KEY (id, bbox, popup)
+            )
+        ''')
+        self.__con.execute("delete from MAP where mtime < ?", (self.maxOld, ))
+        self.__con.commit()
+        self.__data = {}
+        for id, bbox, popup, mtime in self.__con.execute("select id, bbox, popup, mtime from MAP"):
+            self.__data[(id, bbox, popup)] = mtime
+        logger.debug(f"MapCache({path}) = {len(self.__data)} mapas")
+
+    @staticmethod
+    def __key(urlmap: "UrlMap"):
+        return (urlmap.id, urlmap.thumbnail_data.get('BBOX'), urlmap.popup)
+
+    def isOk(self, urlmap: "UrlMap"):
+        mtime = self._data.get(MapCache.__key(urlmap))
+        return mtime is not None and mtime >= self.maxOld
+
+    def save(self, urlmap: "UrlMap"):
+        key = MapCache.__key(urlmap)
+        mtime = time.time()
+        self._data[key] = mtime
+        self.__con.execute(
+            "insert or replace into MAP (id, bbox, popup, mtime) values (?, ?, ?, ?)",
+            key + (mtime, )
+        )
+        self.__con.commit()
+
+
 class BulkRequestsCentro(BulkRequestsFileJob):
     DIR_MAP = {}
-
-    def __init__(self, id: int):
+    MAP_CACHE = MapCache("cache/map.sqlite")
+    # Únicas urls que se leen de la ficha de un centro
+    SOUP_URLS = ("#Mapa img", )
+
+    def __init__(self, id: int, refresh: bool = False):
+        """
+        refresh: vuelve a descargar también las fichas que ya están en
+        cache pero tienen más de maxOld días (las que no han cambiado
+        solo se marcan como comprobadas, ver is_unchanged)
+        """
         self.id = id
+        self.refresh = refresh
         self.centro = Centro(id=id)
         self.html_cache: CentroHtmlCache = getattr(
             self.centro._get_soup,
             "__cache_obj__"
         )
         self.okkomap: Dict[str, bool] = {}
-        self.oksoup: Dict[Tuple, CountSoupCentro] = dict()
+        # fingerprint -> contador
+        self.oksoup: Dict[str, CountSoupCentro] = dict()
+        # similar_fingerprint -> fingerprints
+        self.oksimilar: Dict[str, Set[str]] = defaultdict(set)
+
+    def done(self) -> bool:
+        if self.refresh:
+            return not self.html_cache.tooOld(self.file)
+        return super().done()
+
+    @cached_property
+    def old_fingerprint(self) -> str:
+        """content_fingerprint de la versión de la ficha que ya está en cache"""
+        fingerprint = self.html_cache.get_fingerprint(self.file)
+        if fingerprint is not None or not isfile(self.file):
+            return fingerprint
+        try:
+            spct = SoupCentro(self.id, self.html_cache.read(self.file))
+            spct.check_soup(lazy=True)
+            return spct.content_fingerprint
+        except (DomNotFoundException, CentroException):
+            return None
+
+    def is_unchanged(self, spct: "SoupCentro"):
+        """
+        Si la ficha descargada (que ya pasó la comprobación del mapa) es
+        igual a la que ya está en cache se da por buena sin votación y
+        sin reescribirla
+        """
+        if self.old_fingerprint is None:
+            return False
+        if spct.content_fingerprint != self.old_fingerprint:
+            return False
+        if self.html_cache.get_fingerprint(self.file) is None:
+            self.html_cache.save(self.file, spct.soup)
+        else:
+            self.html_cache.touch(self.file)
+        self.release()
+        return True
 
     def add_ok_before_map(self, spct: "SoupCentro"):
-        if spct.as_tuple not in self.oksoup:
-            self.oksoup[spct.as_tuple] = CountSoupCentro(sc=spct)
-        counter = self.oksoup[spct.as_tuple]
+        if spct.fingerprint not in self.oksoup:
+            self.oksoup[spct.fingerprint] = CountSoupCentro(sc=spct)
+        counter = self.oksoup[spct.fingerprint]
         counter.ok_basic = counter.ok_basic + 1
-        counter.ok_similar = 0
-        for c in self.oksoup.values():
-            if c.sc.similar(spct):
-                counter.ok_similar = counter.ok_similar + 1
+        similar = self.oksimilar[spct.similar_fingerprint]
+        similar.add(spct.fingerprint)
+        counter.ok_similar = len(similar)
 
     def add_ok_after_map(self, spct: "SoupCentro"):
-        counter = self.oksoup[spct.as_tuple]
+        counter = self.oksoup[spct.fingerprint]
         counter.ok_full = counter.ok_full + 1
 
     def get_best(self, silent=False) -> "SoupCentro":
@@ -281,6 +382,12 @@ class BulkRequestsCentro(BulkRequestsFileJob):
 
     def save(self, spct: "SoupCentro"):
         self.html_cache.save(self.file, spct.soup)
+        self.release()
+
+    def release(self):
+        # Una vez guardada la ficha ya no hacen falta las sopas descargadas
+        self.oksoup.clear()
+        self.oksimilar.clear()
 
     @property
     def url(self):
@@ -290,9 +397,9 @@ class BulkRequestsCentro(BulkRequestsFileJob):
     def file(self):
         return self.html_cache.parse_file_name(slf=self.centro)
 
-    async def _get_soup(self, url: str, response: ClientResponse):
+    async def _get_soup(self, url: str, response: ClientResponse, urls: Tuple[str, ...] = SOUP_URLS):
         content = await response.text()
-        return buildSoup(url, content)
+        return buildSoup(url, content, urls=urls)
 
     async def do(self, session: ClientSession):
         if self.countdown == 0 or self.get_best(silent=True) is not None:
@@ -312,6 +419,8 @@ class BulkRequestsCentro(BulkRequestsFileJob):
             self.add_ok_before_map(spct)
             if not await self.do_map(session, spct):
                 return False
+            if self.is_unchanged(spct):
+                return True
             self.add_ok_after_map(spct)
             spct = self.get_best()
             if spct is None:
@@ -335,6 +444,8 @@ class BulkRequestsCentro(BulkRequestsFileJob):
                         self.centro.id,
                         urlmap.get_breadcrumbs()
                     )
+                if self.is_unchanged(spct):
+                    return True
                 self.add_ok_after_map(spct)
             except (DomNotFoundException, CentroException, BadMapException) as e:
                 exc = e
@@ -357,18 +468,25 @@ class BulkRequestsCentro(BulkRequestsFileJob):
             return True
         if urlmap.url in self.okkomap:
             return self.okkomap[urlmap.url]
-        for url in urlmap.urls:
-            if await self._do_map(session, url, spct):
+        if BulkRequestsCentro.MAP_CACHE.isOk(urlmap):
+            self.okkomap[urlmap.url] = True
+            return True
+        for ring in urlmap.rings:
+            oks = await asyncio.gather(*(
+                self._do_map(session, url, spct) for url in ring
+            ))
+            if any(oks):
                 if direcc:
                     BulkRequestsCentro.DIR_MAP[direcc] = urlmap.popup
                 self.okkomap[urlmap.url] = True
+                BulkRequestsCentro.MAP_CACHE.save(urlmap)
                 return True
         self.okkomap[urlmap.url] = False
         return False
 
     async def _do_map(self, session: ClientSession, url: str, spct: "SoupCentro"):
         async with session.get(url) as maprsponse:
-            mpsp = await self._get_soup(url, maprsponse)
+            mpsp = await self._get_soup(url, maprsponse, urls=tuple())
             return spct._check_info_map(mpsp)
 
 
@@ -380,18 +498,15 @@ class Etapa(NamedTuple):
     nivel: int
 
     def merge(self, **kwargs):
-        return Etapa(**{
-            **self._asdict(),
-            **kwargs
-        })
+        return self._replace(**kwargs)
 
     def notnull(self):
-        return self.merge(
-            nombre=(self.nombre or ''),
-            titularidad=(self.titularidad or ''),
-            tipo=(self.tipo or ''),
-            plazas=(self.plazas or ''),
-            nivel=(self.nivel or -1),
+        return Etapa(
+            self.nombre or '',
+            self.titularidad or '',
+            self.tipo or '',
+            self.plazas or '',
+            self.nivel or -1
         )
 
 
@@ -400,6 +515,12 @@ class UrlMap:
     id: int
     thumbnail: str
     popup: str
+    # Coordenada UTM (EPSG:23030) del centro según su ficha
+    xy: Tuple[float, float] = None
+    # Separación, en píxeles, entre los puntos consultados
+    STEP = 15
+    # Número máximo de consultas simultáneas por anillo
+    BATCH = 8
 
     @cached_property
     def thumbnail_data(self):
@@ -407,30 +528,67 @@ class UrlMap:
 
     @cached_property
     def width(self):
-        return int(self.thumbnail_data['WIDTH'])
+        return int(self.thumbnail_data.get('WIDTH') or 0)
 
     @cached_property
     def height(self):
-        return int(self.thumbnail_data['HEIGHT'])
+        return int(self.thumbnail_data.get('HEIGHT') or 0)
 
     @cached_property
     def url(self):
         return self.get_url(self.width/2, self.height/2)
 
+    @cached_property
+    def pixel(self) -> Tuple[int, int]:
+        """Píxel del mapa en el que debería estar el centro"""
+        cnt = (int(self.width/2), int(self.height/2))
+        if self.xy is None:
+            return cnt
+        try:
+            minx, miny, maxx, maxy = map(float, self.thumbnail_data['BBOX'].split(","))
+        except (KeyError, ValueError):
+            return cnt
+        if minx >= maxx or miny >= maxy:
+            return cnt
+        x, y = self.xy
+        px = int((x - minx) * self.width / (maxx - minx))
+        py = int((maxy - y) * self.height / (maxy - miny))
+        if not (0 <= px < self.width and 0 <= py < self.height):
+            return cnt
+        return (px, py)
+
     @cached_property
     def urls(self):
-        arr = []
+        return tuple(u for r in self.rings for u in r)
+
+    @cached_property
+    def rings(self) -> Tuple[Tuple[str, ...], ...]:
+        """
+        Urls GetFeatureInfo agrupadas en anillos alrededor de self.pixel:
+        primero el propio píxel (con un margen de STEP píxeles) y luego
+        la rejilla de STEP píxeles en tandas de como mucho BATCH urls.
+        Sin coordenadas del centro o con un thumbnail sin tamaño no hay
+        nada que consultar
+        """
+        if self.xy is None or self.width <= 0 or self.height <= 0:
+            return tuple()
         points = set()
-        for x in range(1, self.width, 15):
-            for y in range(1, self.height, 15):
+        for x in range(1, self.width, UrlMap.STEP):
+            for y in range(1, self.height, UrlMap.STEP):
                 points.add((x, y))
-        cnt = (int(self.width/2), int(self.height/2))
-        points = sorted(points, key=lambda xy: abs(math.dist(xy, cnt)))
+        points = sorted(points, key=lambda xy: abs(math.dist(xy, self.pixel)))
+        rings = [(self.get_url(*self.pixel, buffer=UrlMap.STEP), )]
+        ring = []
         for x, y in points:
-            arr.append(self.get_url(x, y))
-        return tuple(arr)
-
-    def get_url(self, x: int, y: int):
+            ring.append(self.get_url(x, y))
+            if len(ring) == UrlMap.BATCH:
+                rings.append(tuple(ring))
+                ring = []
+        if ring:
+            rings.append(tuple(ring))
+        return tuple(rings)
+
+    def get_url(self, x: int, y: int, buffer: int = None):
         data = {
             'VIEWPARAMS': '',
             'SERVICE': '',
@@ -446,6 +604,9 @@ class UrlMap:
             'X': str(int(x)),
             'Y': str(int(y))
         }
+        if buffer:
+            # Radio de búsqueda en píxeles (parámetro propio de geoserver)
+            data['BUFFER'] = str(int(buffer))
         for k in ('BBOX', 'HEIGHT', 'WIDTH'):
             data[k] = self.thumbnail_data[k]
         url = 'https://idem.madrid.org/geoserver/wms'
@@ -458,6 +619,20 @@ class UrlMap:
         ])
 
 
+class FichaCentro(NamedTuple):
+    """Datos que se usan de la ficha de un centro, ya sin el html"""
+    web: Tuple[str, ...]
+    email: Tuple[str, ...]
+    telefono: Tuple[int, ...]
+    latlon: LatLon
+    titular: str
+    etapas: Tuple[Etapa, ...]
+    educacion_diferenciada: Tuple[str, ...]
+    extraescolares: Tuple[str, ...]
+    planes: Tuple[str, ...]
+    proyectos: Tuple[str, ...]
+
+
 class SoupCentro:
     def __init__(self, id: int, soup: BeautifulSoup):
         self.id = id
@@ -473,13 +648,32 @@ class SoupCentro:
         return self.as_tuple == other.as_tuple
 
     def similar(self, other: "SoupCentro"):
-        def _tp(o:  "SoupCentro"):
-            arr = []
-            for e in o.as_tuple:
-                if not isinstance(e, LatLon):
-                    arr.append(e)
-            return tuple(arr)
-        return _tp(self) == _tp(other)
+        return self.similar_tuple == other.similar_tuple
+
+    @cached_property
+    def similar_tuple(self):
+        return tuple(e for e in self.as_tuple if not isinstance(e, LatLon))
+
+    @cached_property
+    def fingerprint(self) -> str:
+        return sha1(repr(self.as_tuple).encode()).hexdigest()
+
+    @cached_property
+    def similar_fingerprint(self) -> str:
+        return sha1(repr(self.similar_tuple).encode()).hexdigest()
+
+    @cached_property
+    def content_fingerprint(self) -> str:
+        """fingerprint de todo lo que se usa de la ficha"""
+        return sha1(repr((
+            self.as_tuple,
+            self.email,
+            self.telefono,
+            self.extraescolares,
+            self.planes,
+            self.proyectos,
+            select_attr(self.soup, "#Mapa img", "src", safe=True),
+        )).encode()).hexdigest()
 
     @cached_property
     def as_tuple(self):
@@ -527,10 +721,10 @@ class SoupCentro:
 
     @cached_property
     def telefono(self) -> Tuple[str]:
-        fax = _get_telefono(self.inputs.get("tlFax"))
-        tlfs = list(_get_telefono(self.inputs.get("tlTelefono")))
+        fax = parse_telefono(self.inputs.get("tlFax"))
+        tlfs = list(parse_telefono(self.inputs.get("tlTelefono")))
         for txt in self.__iter_strong_text():
-            for m in _get_telefono(txt):
+            for m in parse_telefono(txt):
                 if m not in tlfs and m not in fax:
                     tlfs.append(m)
         return tuple(tlfs)
@@ -668,6 +862,20 @@ class SoupCentro:
                 arr.add(t)
         return tuple(sorted(arr))
 
+    def extract(self) -> FichaCentro:
+        return FichaCentro(
+            web=self.web,
+            email=self.email,
+            telefono=self.telefono,
+            latlon=self.latlon,
+            titular=self.titular,
+            etapas=self.etapas,
+            educacion_diferenciada=self.educacion_diferenciada,
+            extraescolares=self.extraescolares,
+            planes=self.planes,
+            proyectos=self.proyectos,
+        )
+
     def check_soup(self, lazy=False):
         info = Centro(self.id).info
         body = self.soup.find("body")
@@ -755,6 +963,7 @@ class SoupCentro:
             id=self.id,
             thumbnail=mapa,
             popup=popup,
+            xy=self.utm_ed50_huso_30_x_y,
         )
 
 
@@ -797,8 +1006,8 @@ class OpenDataCentro(NamedTuple):
             return None
         new_obj = {}
         for k, v in obj.items():
-            k = _parse_k(k)
-            v =  _parse(k, v)
+            k = parse_key(k)
+            v = parse_value(k, v)
             new_obj[k] = v
         return OpenDataCentro(**new_obj)
 
@@ -811,7 +1020,7 @@ class OpenDataCentro(NamedTuple):
             return latlon.round(7)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Centro:
     id: int
     area: str = None
@@ -828,26 +1037,52 @@ class Centro:
     accesibilidad: Tuple[int, ...] = tuple()
     _latlon: LatLon = field(repr=False, init=False, default=None)
     _webs: Tuple[str, ...] = field(repr=False, init=False, default=tuple())
+    _home: FichaCentro = field(repr=False, init=False, default=None, compare=False)
+    _etapas: Tuple[Etapa, ...] = field(repr=False, init=False, default=None, compare=False)
 
     @classmethod
     def build(cls, head: Tuple, row: Tuple):
-        obj = {h: _parse(h, c) for h, c in zip_longest(head, row)}
-        mails = MChecker.find_email(*row[head.index("EMAIL"):])
-        titularidad = _find_titularidad(row[head.index("EMAIL2")+1:])
-        return cls(
-            area=obj['AREA TERRITORIAL'],
-            id=obj['CODIGO CENTRO'],
-            tipo=obj['TIPO DE CENTRO'],
-            nombre=obj['CENTRO'],
-            domicilio=obj['DOMICILIO'],
-            municipio=obj['MUNICIPIO'],
-            distrito=obj['DISTRITO MUNICIPAL'],
-            cp=obj['COD. POSTAL'],
-            telefono=_get_telefono(obj['TELEFONO']),
-            email=mails,
-            titularidad=titularidad,
-            fax=_get_telefono(obj['FAX']),
-        )
+        return next(cls.iter_build(head, (row, )))
+
+    @classmethod
+    def iter_build(cls, head: Tuple[str, ...], rows: Iterable[Tuple[str, ...]]):
+        """
+        Construye los centros de las filas de un csv calculando una
+        sola vez la posición de cada columna y parseando solo las
+        celdas que se usan
+        """
+        col = {h: i for i, h in enumerate(head)}
+        cols = tuple((k, col[k]) for k in (
+            'AREA TERRITORIAL',
+            'CODIGO CENTRO',
+            'TIPO DE CENTRO',
+            'CENTRO',
+            'DOMICILIO',
+            'MUNICIPIO',
+            'DISTRITO MUNICIPAL',
+            'COD. POSTAL',
+            'TELEFONO',
+            'FAX',
+        ))
+        i_mail = head.index("EMAIL")
+        i_tit = head.index("EMAIL2") + 1
+        for row in rows:
+            size = len(row)
+            obj = {k: (parse_value(k, row[i]) if i < size else None) for k, i in cols}
+            yield cls(
+                area=obj['AREA TERRITORIAL'],
+                id=obj['CODIGO CENTRO'],
+                tipo=obj['TIPO DE CENTRO'],
+                nombre=obj['CENTRO'],
+                domicilio=obj['DOMICILIO'],
+                municipio=obj['MUNICIPIO'],
+                distrito=obj['DISTRITO MUNICIPAL'],
+                cp=obj['COD. POSTAL'],
+                telefono=parse_telefono(obj['TELEFONO']),
+                email=MChecker.find_email(*row[i_mail:]),
+                titularidad=_find_titularidad(row[i_tit:]),
+                fax=parse_telefono(obj['FAX']),
+            )
 
     def replace(
         self,
@@ -871,7 +1106,7 @@ class Centro:
         return c
 
     def _asdict(self):
-        return asdict(self)
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.compare}
 
     def fix(self):
         self.fix_mail()
@@ -899,13 +1134,17 @@ class Centro:
         if is_telf != self.telefono:
             object.__setattr__(self, 'telefono', is_telf)
 
-    @cached_property
+    @property
     def info(self):
         return f"https://gestiona.comunidad.madrid/wpad_pub/run/j/MostrarFichaCentro.icm?cdCentro={self.id}"
 
-    @cached_property
-    def home(self):
-        return SoupCentro(self.id, self._get_soup())
+    @property
+    def home(self) -> FichaCentro:
+        if self._home is None:
+            # Solo se guardan los datos extraídos, el html se libera
+            ficha = SoupCentro(self.id, self._get_soup()).extract()
+            object.__setattr__(self, '_home', ficha)
+        return self._home
 
     @CentroHtmlCache(
         file="cache/html/",
@@ -939,12 +1178,17 @@ class Centro:
             if GEO.is_in(latlon, self.cp, self.municipio, self.distrito):
                 return latlon
 
-    @cached_property
+    @property
     def titular(self):
         return self.home.titular
 
-    @cached_property
+    @property
     def etapas(self) -> Tuple[Etapa]:
+        if self._etapas is None:
+            object.__setattr__(self, '_etapas', self._get_etapas())
+        return self._etapas
+
+    def _get_etapas(self) -> Tuple[Etapa]:
         def get_tit(cnt: Centro, et: Etapa):
             t = _parse_titularidad(et.titularidad)
             if t is not None:
@@ -980,19 +1224,19 @@ class Centro:
                 etps[i] = e.merge(tipo=tip.pop())
         return tuple(sorted(set(etps), key=lambda x: x.notnull()))
 
-    @cached_property
+    @property
     def educacion_diferenciada(self):
         return self.home.educacion_diferenciada
 
-    @cached_property
+    @property
     def extraescolares(self):
         return self.home.extraescolares
 
-    @cached_property
+    @property
     def planes(self):
         return self.home.planes
 
-    @cached_property
+    @property
     def proyectos(self):
         return self.home.proyectos
 
@@ -75,11 +75,17 @@ class Colegio:
     def get(id: int):
         c = Colegio(id)
         try:
-            c.home
+            c.extract()
         except DomNotFoundException:
             return None
         return c
 
+    def extract(self):
+        """Calcula todos los datos de la ficha y libera el html"""
+        for k in ("latlon", "email", "web", "telefono"):
+            getattr(self, k)
+        self.__dict__.pop("home", None)
+
     @cached_property
     def info(self):
         return f"http://www.buscocolegio.com/Colegio/detalles-colegio.action?id={self.id}"
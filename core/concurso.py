@@ -1,17 +1,23 @@
 from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
 import re
 from typing import Dict
 import logging
 from dataclasses import dataclass
 from os.path import isfile
-from .filemanager import FM, FileManager
+from .filemanager import FM
 from .web import Driver, Web
-from .util import hashme
+from .util import hashme, hashfile
+from .idset import IdSet
+from .fetcher import AsyncFetcher
+from aiohttp import ClientResponse
+from collections import defaultdict
 from abc import ABC, abstractmethod
 from bs4 import Tag, BeautifulSoup
 from time import sleep
 from pathlib import Path
-from os import environ
+from os import environ, getpid
+from threading import get_ident
 from datetime import datetime
 import requests
 
@@ -75,28 +81,43 @@ def get_text(n: Tag):
     return txt
 
 
-def descargar_pdf(url, destino: Path):
-    response = requests.get(url, timeout=30, verify=VERIFY)
-
-    response.raise_for_status()
-
-    content_type = response.headers.get("Content-Type", "").lower()
-
+def check_pdf(content_type: str, content: bytes):
+    content_type = (content_type or "").lower()
     if "pdf" not in content_type:
         raise ValueError(
             f"El servidor no devolvió un PDF. Content-Type: {content_type}"
         )
-
-    content = response.content
-
     if not content.startswith(b"%PDF-"):
         raise ValueError("El archivo no tiene cabecera PDF válida")
 
-    destino.write_bytes(content)
+
+def write_pdf(destino: Path, content: bytes):
+    # Se escribe en un temporal (propio de cada proceso e hilo) y se renombra
+    # para no dejar nunca pdf a medias
+    FM.makedirs(destino)
+    tmp = destino.with_name(f"{destino.name}.{getpid()}-{get_ident()}.part")
+    tmp.write_bytes(content)
+    tmp.replace(destino)
+
+
+def descargar_pdf(url, destino: Path):
+    response = requests.get(url, timeout=30, verify=VERIFY)
+
+    response.raise_for_status()
+
+    content = response.content
+    check_pdf(response.headers.get("Content-Type"), content)
+    write_pdf(destino, content)
 
     return True
 
 
+async def rq_to_pdf(r: ClientResponse):
+    r.raise_for_status()
+    content = await r.read()
+    check_pdf(r.headers.get("Content-Type"), content)
+    return content
+
 
 @dataclass(frozen=True)
 class Anexo():
@@ -104,6 +125,7 @@ class Anexo():
     txt: str
     url: str
     letter: str = None
+    CTR_CACHE = "cache/pdf/ctr"
 
     @cached_property
     def local_pdf(self):
@@ -112,6 +134,20 @@ class Anexo():
                 f"cache/pdf/{self.num:02}{self.letter or ''} - {self.txt[:30]} - {hashme(self.url)}.pdf"
             )
 
+    @cached_property
+    def old_ctr(self) -> Path:
+        """Fichero .ctr.txt antiguo (junto al pdf y con su mismo nombre)"""
+        if self.local_pdf is not None:
+            return self.local_pdf.with_suffix(".ctr.txt")
+
+    @cached_property
+    def pdf_hash(self) -> str:
+        """sha1 del contenido del pdf (que se descarga si hace falta)"""
+        if self.local_pdf is None:
+            return None
+        self.__download()
+        return hashfile(self.local_pdf)
+
     def __is_pdf(self):
         if self.url.rsplit(".")[-1].lower() in ("pdf",):
             return True
@@ -119,25 +155,33 @@ class Anexo():
             return True
 
     @cached_property
-    def content(self):
+    def content(self) -> str:
+        return self.__read_content()
+
+    def __read_content(self):
         if self.local_pdf is None:
             return ""
-        if not isfile(self.local_pdf):
-            FM.makedirs(self.local_pdf)
-            if descargar_pdf(self.url, self.local_pdf) is not True:
-                with Driver(browser="firefox") as WEB:
-                    WEB.get(self.url)
-                    sleep(5)
-                    s = WEB.pass_cookies()
-                    r = s.get(self.url)
-                    with open(self.local_pdf, "wb") as f:
-                        f.write(r.content)
+        self.__download()
         txt: str = FM.load(self.local_pdf)
         txt = txt.strip()
         return txt
 
+    def __download(self):
+        if isfile(self.local_pdf):
+            return
+        FM.makedirs(self.local_pdf)
+        if descargar_pdf(self.url, self.local_pdf) is not True:
+            with Driver(browser="firefox") as WEB:
+                WEB.get(self.url)
+                sleep(5)
+                s = WEB.pass_cookies()
+                r = s.get(self.url)
+                write_pdf(self.local_pdf, r.content)
+
     def __get_centros(self):
-        ids = re.findall(r"\b28\d{6}\b", self.content)
+        if "content" not in self.__dict__:
+            self.__dict__["content"] = self.__read_content()
+        ids = re.findall(r"\b28\d{6}\b", self.__dict__["content"])
         arr: list[int] = []
         for i in map(int, ids):
             if i not in arr:
@@ -145,17 +189,83 @@ class Anexo():
         return tuple(arr)
 
     @cached_property
-    def centros(self):
-        local_ctr: None | Path = None
-        if self.local_pdf is not None and self.local_pdf.with_suffix(FileManager.OCR_SUFFIX).exists():
-            local_ctr = self.local_pdf.with_suffix(".ctr.txt")
-        if local_ctr is not None and local_ctr.exists():
-            lines = FM.load_txt(local_ctr).strip().split()
-            return tuple(sorted(map(int, lines)))
+    def centros(self) -> IdSet:
+        return self.__read_centros()
+
+    def load(self):
+        """
+        Lee los centros (y si hace falta el texto) del anexo sin pasar por
+        cached_property, que en python < 3.12 bloquea a la vez a todas las
+        instancias y no dejaría leer anexos en paralelo
+        """
+        if "centros" not in self.__dict__:
+            self.__dict__["centros"] = self.__read_centros()
+
+    def __read_centros(self):
+        if self.local_pdf is None:
+            return IdSet()
+        if self.old_ctr.exists():
+            return IdSet(map(int, FM.load_txt(self.old_ctr).split()))
+        # Los centros de cada pdf se guardan según el hash de su contenido
+        local_ctr = FM.resolve_path(f"{Anexo.CTR_CACHE}/{self.pdf_hash}.txt")
+        if local_ctr.exists():
+            return IdSet(map(int, FM.load_txt(local_ctr).split()))
         ctr = self.__get_centros()
-        if ctr and local_ctr is not None:
-            FM.dump_txt(local_ctr, "\n".join(map(str, ctr)))
-        return tuple(sorted(ctr))
+        # Se escribe en un temporal y se renombra para que nadie lea uno a medias
+        tmp = local_ctr.with_name(f"{local_ctr.name}.{getpid()}-{get_ident()}.part")
+        FM.dump(tmp, "\n".join(map(str, ctr)))
+        tmp.replace(local_ctr)
+        return IdSet(ctr)
+
+
+def prefetch_pdf(*anexos: Anexo, max_concurrency: int = 8):
+    """
+    Descarga a la vez los pdf de los anexos que aún no están en cache/pdf/
+    Los que fallen se quedan sin descargar y se vuelven a intentar
+    (uno a uno) al leer Anexo.content
+    """
+    todo: Dict[str, set[Path]] = defaultdict(set)
+    for a in anexos:
+        if a.local_pdf is not None and not isfile(a.local_pdf):
+            todo[a.url].add(a.local_pdf)
+    if len(todo) == 0:
+        return
+    logger.info(f"Descargando {len(todo)} pdf")
+    urls = sorted(todo.keys())
+    fetcher = AsyncFetcher(
+        onread=rq_to_pdf,
+        max_concurrency=max_concurrency,
+        raise_for_status=False,
+        retries=2,
+        verify=VERIFY
+    )
+    for url, content in zip(urls, fetcher.run(*urls)):
+        if content is None:
+            continue
+        for destino in todo[url]:
+            write_pdf(destino, content)
+
+
+def load_anexos(*anexos: Anexo, workers: int = 4):
+    """
+    Descarga y extrae el texto y los centros de varios anexos a la vez
+    (el ocr de cada pdf además se reparte por páginas entre los procesos
+    de FM, que se crean aquí desde el hilo principal)
+    """
+    prefetch_pdf(*anexos)
+    # Un solo hilo por contenido de pdf (la misma url puede estar en
+    # varios anexos con distinto nombre de fichero), el resto de anexos
+    # lo leen después de cache
+    uniq: Dict[str, Anexo] = {}
+    for a in anexos:
+        if a.local_pdf is not None and not a.old_ctr.exists():
+            uniq.setdefault(a.pdf_hash, a)
+    FM.start_ocr_pool()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in executor.map(Anexo.load, uniq.values()):
+            pass
+    for a in anexos:
+        a.load()
 
 
 def _get_concurso_url(url: str):
@@ -224,10 +334,7 @@ class Concurso(ABC):
 
     @cached_property
     def centros(self):
-        centros = set()
-        for a in self.anexos.values():
-            centros = centros.union(a.centros)
-        return tuple(sorted(centros))
+        return IdSet().union(*(a.centros for a in self.anexos.values()))
 
     @cached_property
     def abr(self) -> str:
@@ -5,6 +5,7 @@ import errno
 from os.path import isfile
 from functools import cache
 import re
+from typing import Iterable
 
 
 logger = logging.getLogger(__name__)
@@ -31,6 +32,9 @@ class EmptyInsertException(sqlite3.OperationalError):
 
 
 class DBLite:
+    # Comprobaciones que se pueden hacer al cerrar una db de escritura
+    CHECKS = ("none", "quick_check", "full")
+
     @staticmethod
     def get_connection(file, *extensions, readonly=False):
         logger.info(f"DBLite({file})")
@@ -52,8 +56,11 @@ class DBLite:
         with cls(path, readonly=True) as db:
             db.sql_backup(out)
 
-    def __init__(self, file, extensions=None, reload=False, readonly=False):
+    def __init__(self, file, extensions=None, reload=False, readonly=False, check="none"):
+        if check not in DBLite.CHECKS:
+            raise ValueError(f"check={check} no está en {DBLite.CHECKS}")
         self.readonly = readonly
+        self.check = check
         self.file = file
         if reload and isfile(self.file):
             os.remove(self.file)
@@ -151,6 +158,17 @@ class DBLite:
             msg = re.sub(r"\?", '{}', sql).format(*vals)
             raise sqlite3.DatabaseError(msg) from e
 
+    def insert_many(self, table: str, cols: tuple[str, ...], rows: Iterable[tuple], _or=""):
+        """Inserta de una vez filas que tienen todas las mismas columnas"""
+        if _or is None:
+            _or = ""
+        elif len(_or):
+            _or = "or "+_or
+        keys = ', '.join(map(lambda k: '"' + k + '"', cols))
+        prm = ', '.join(['?'] * len(cols))
+        sql = f"insert {_or} into {table} ({keys}) values ({prm})"
+        self.con.executemany(sql, rows)
+
     def _build_select(self, sql: str):
         sql = sql.strip()
         if not sql.lower().startswith("select"):
@@ -163,32 +181,116 @@ class DBLite:
     def commit(self):
         self.con.commit()
 
-    def close(self, vacuum=True):
+    def close(self, check: str = None):
         if self.readonly:
             self.con.close()
             return
         self.closeTransaction()
         self.con.commit()
-        if vacuum:
-            c = self.con.execute("pragma integrity_check")
-            c = c.fetchone()
-            if c:
-                logger.info(f"integrity_check = {c[0]}")
-            else:
-                logger.info("integrity_check = ¿?")
-            c = self.con.execute("pragma foreign_key_check")
-            c = c.fetchall()
-            logger.info("foreign_key_check = " + ("ko" if c else "ok"))
-            for table, parent in set((i[0], i[2]) for i in c):
-                logger.info(f"  {table} -> {parent}")
-            self.con.execute("VACUUM")
-        self.con.commit()
+        self.do_check(check or self.check)
         self.con.close()
 
+    def do_check(self, check: str):
+        if check not in DBLite.CHECKS:
+            raise ValueError(f"check={check} no está en {DBLite.CHECKS}")
+        if check == "none":
+            return
+        pragma = "quick_check" if check == "quick_check" else "integrity_check"
+        c = self.con.execute(f"pragma {pragma}")
+        c = c.fetchone()
+        if c:
+            logger.info(f"{pragma} = {c[0]}")
+        else:
+            logger.info(f"{pragma} = ¿?")
+        if check != "full":
+            return
+        c = self.con.execute("pragma foreign_key_check")
+        c = c.fetchall()
+        logger.info("foreign_key_check = " + ("ko" if c else "ok"))
+        for table, parent in set((i[0], i[2]) for i in c):
+            logger.info(f"  {table} -> {parent}")
+
+    def optimize(self):
+        """
+        Actualiza las estadísticas del planificador y reescribe la db
+        entera (VACUUM), por lo que conviene hacerlo una sola vez al final
+        """
+        self.closeTransaction()
+        self.con.commit()
+        logger.info(f"DBLite.optimize({self.file})")
+        self.con.execute("pragma optimize")
+        self.con.execute("VACUUM")
+        self.con.commit()
+
+    @property
+    def schema(self) -> tuple[tuple[str, str, str]]:
+        return self.to_tuple("SELECT type, name, sql FROM sqlite_master where sql is not null order by type, name")
+
+    def get_pk(self, table: str) -> tuple[str]:
+        rows = self.to_tuple(f'select pk, name from pragma_table_info("{table}") where pk > 0 order by pk')
+        return tuple(name for _, name in rows)
+
+    def sync(self, src: str) -> dict[str, tuple[int, int]]:
+        """
+        Deja esta base de datos igual que la del fichero src aplicando,
+        en una única transacción, solo los delete e insert necesarios
+        (por clave primaria) en cada tabla.
+        Si el esquema no coincide se copia src entera.
+        Devuelve {tabla: (borrados, insertados)}
+        """
+        self.closeTransaction()
+        with DBLite(src, readonly=True) as s:
+            if self.schema != s.schema:
+                logger.info("DBLite.sync: esquema distinto, se copia la db entera")
+                s.con.backup(self.con)
+                self.clear_cache()
+                return {}
+        changes: dict[str, tuple[int, int]] = {}
+        fk = self.con.execute("pragma foreign_keys").fetchone()[0]
+        # El resultado final es consistente, pero no lo es tabla a tabla
+        self.con.execute("pragma foreign_keys = OFF")
+        self.con.execute("ATTACH DATABASE ? AS src", (src, ))
+        try:
+            self.openTransaction()
+            for table in self.tables:
+                if table.startswith("sqlite_"):
+                    continue
+                # Sin clave primaria cada fila se identifica por todas sus columnas
+                key = self.get_pk(table) or self.get_cols(table)
+                on = " and ".join(map(lambda c: f'm."{c}" is x."{c}"', key))
+                # Se borran las filas que desaparecen o cambian y se insertan las nuevas o cambiadas
+                dlt = self.con.execute(f'''
+                    delete from main."{table}" where rowid in (
+                        select m.rowid from main."{table}" m join (
+                            select * from main."{table}" except select * from src."{table}"
+                        ) x on {on}
+                    )
+                ''').rowcount
+                ins = self.con.execute(f'''
+                    insert into main."{table}"
+                    select * from src."{table}" except select * from main."{table}"
+                ''').rowcount
+                if dlt or ins:
+                    changes[table] = (dlt, ins)
+                    logger.info(f"DBLite.sync: {table} -{dlt} +{ins}")
+            self.closeTransaction()
+        except Exception:
+            self.con.execute("ROLLBACK")
+            self.__in_transaction = False
+            raise
+        finally:
+            self.con.execute("DETACH DATABASE src")
+            self.con.execute(f"pragma foreign_keys = {fk}")
+        if changes:
+            # Las estadísticas del planificador se recalculan, no se copian
+            self.con.execute("ANALYZE")
+        self.clear_cache()
+        return changes
+
     def select(self, sql: str, *args, row_factory=None, **kwargs):
         sql = self._build_select(sql)
-        self.con.row_factory = row_factory
         cursor = self.con.cursor()
+        cursor.row_factory = row_factory
         try:
             if len(args):
                 cursor.execute(sql, args)
@@ -200,7 +302,6 @@ class DBLite:
         for r in ResultIter(cursor):
             yield r
         cursor.close()
-        self.con.row_factory = None
 
     def to_tuple(self, *args, **kwargs):
         arr = []
@@ -212,71 +313,104 @@ class DBLite:
 
     def one(self, sql: str, *args, row_factory=None):
         sql = self._build_select(sql)
-        self.con.row_factory = row_factory
         cursor = self.con.cursor()
+        cursor.row_factory = row_factory
         if len(args):
             cursor.execute(sql, args)
         else:
             cursor.execute(sql)
         r = cursor.fetchone()
         cursor.close()
-        self.con.row_factory = None
         if not r:
             return None
         if isinstance(r, (tuple, list)) and len(r) == 1:
             return r[0]
         return r
 
+    def __iter_schema(self):
+        # Mismo orden que sqlite3.Connection.iterdump: tablas por nombre
+        # y luego índices, triggers y vistas
+        for name, sql in self.to_tuple('''
+            SELECT name, sql FROM sqlite_master
+            WHERE sql NOT NULL AND type == 'table'
+            ORDER BY name
+        '''):
+            if name == "sqlite_stat1":
+                # Como iterdump: se crea con ANALYZE y luego se vuelcan sus filas
+                yield name, 'ANALYZE "sqlite_master"'
+            elif not name.startswith("sqlite_"):
+                yield name, sql
+        for name, sql in self.to_tuple('''
+            SELECT name, sql FROM sqlite_master
+            WHERE sql NOT NULL AND type IN ('index', 'trigger', 'view')
+        '''):
+            yield None, sql
+
+    def __iter_values(self, table: str):
+        # sqlite formatea cada fila igual que iterdump, con quote()
+        table = table.replace('"', '""')
+        cols = (c[1].replace('"', '""') for c in self.con.execute(f'PRAGMA table_info("{table}")'))
+        row = "||','||".join(map(lambda c: f'quote("{c}")', cols))
+        cursor = self.con.cursor()
+        cursor.execute(f'SELECT {row} FROM "{table}"')
+        for r in ResultIter(cursor):
+            yield r[0]
+        cursor.close()
+
     def iter_sql_backup(self, width_values=-1, multiple_limit=-1):
-        re_insert = re.compile(r'^INSERT\s+INTO\s+(.+)\s+VALUES\s*\((.*)\);$')
         yield 'PRAGMA foreign_keys=OFF;'
         yield 'BEGIN TRANSACTION;'
-        for lines in self.con.iterdump():
-            for line in lines.split("\n"):
+        tables: list[str] = []
+        for table, sql in self.__iter_schema():
+            if table is not None:
+                tables.append(table)
+            for line in (sql+";").split("\n"):
                 ln = line.strip().upper()
                 if ln in ("", "COMMIT;", "BEGIN TRANSACTION;"):
                     continue
                 if ln.startswith("INSERT INTO ") or ln.startswith("--"):
                     continue
                 yield line
-        table = None
-        lsttb = None
-        count = 0
-        values = []
-
-        def val_to_str(vls, end):
-            return ",".join(vls)+end
-
-        for line in self.con.iterdump():
-            m = re_insert.match(line)
-            if m is None:
-                continue
+        for table in tables:
             if multiple_limit == 1:
-                yield line
+                qtable = table.replace('"', '""')
+                for v in self.__iter_values(table):
+                    yield f'INSERT INTO "{qtable}" VALUES({v});'
                 continue
-            table = m.group(1).strip('"')
-            if table != lsttb or count == 0:
-                if values:
-                    yield val_to_str(values, ";")
-                    values = []
-                yield f"INSERT INTO {table} VALUES"
-                count = multiple_limit
-            values.append("("+m.group(2)+")")
-            if len(values) > 1 and len(",".join(values)) > width_values:
-                yield val_to_str(values[:-1], ",")
-                values = [values[-1]]
-            count = count - 1
-            lsttb = table
-        if values:
-            yield val_to_str(values, ";")
-            values = []
+            count = 0
+            width = 0
+            values: list[str] = []
+            for v in self.__iter_values(table):
+                if count == 0:
+                    if values:
+                        yield ",".join(values)+";"
+                        values = []
+                    yield f"INSERT INTO {table} VALUES"
+                    count = multiple_limit
+                    width = 0
+                v = "("+v+")"
+                width = width + len(v) + (1 if values else 0)
+                values.append(v)
+                if len(values) > 1 and width > width_values:
+                    yield ",".join(values[:-1])+","
+                    values = [v]
+                    width = len(v)
+                count = count - 1
+            if values:
+                yield ",".join(values)+";"
         yield 'COMMIT;'
         yield 'VACUUM;'
         yield 'PRAGMA foreign_keys=ON;'
         yield 'pragma integrity_check;'
         yield 'pragma foreign_key_check;'
 
-    def sql_backup(self, file, *args, **kwargs):
-        with open(file, "w") as f:
+    def sql_backup(self, file, *args, buffer_lines=10000, **kwargs):
+        with open(file, "w", buffering=1024*1024) as f:
+            lines = []
             for line in self.iter_sql_backup(*args, **kwargs):
-                f.write(line+"\n")
+                lines.append(line)
+                if len(lines) >= buffer_lines:
+                    f.write("\n".join(lines)+"\n")
+                    lines = []
+            if lines:
+                f.write("\n".join(lines)+"\n")
@@ -0,0 +1,88 @@
+import gzip
+import json
+import logging
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from typing import Dict, List, Any
+
+from .dblite import DBLite
+from .filemanager import FM
+
+logger = logging.getLogger(__name__)
+
+
+class Export:
+    """
+    Exporta cada tabla de una db a {out}/{tabla}/{n}.ndjson.gz
+    (una fila json por línea, ordenadas por todas sus columnas y en trozos
+    de como mucho chunk_rows filas) más un {out}/manifest.json con el
+    número de filas y el sha256 del contenido de cada tabla y trozo.
+    Los gzip se escriben sin nombre ni fecha para que, si los datos no
+    cambian, los ficheros tampoco.
+    """
+    MANIFEST = "manifest.json"
+
+    def __init__(self, db: str, out: str = "out/export", chunk_rows: int = 50000, workers: int = 4):
+        self.db = db
+        self.out = FM.resolve_path(out)
+        self.chunk_rows = chunk_rows
+        self.workers = workers
+
+    def run(self) -> Dict[str, Any]:
+        with DBLite(self.db, readonly=True) as db:
+            tables = tuple(t for t in db.tables if not t.startswith("sqlite_"))
+        if self.out.exists():
+            shutil.rmtree(self.out)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            items = executor.map(self.export_table, tables)
+            manifest = {
+                "tables": dict(zip(tables, items))
+            }
+        FM.dump_json(self.out.joinpath(Export.MANIFEST), manifest)
+        return manifest
+
+    def export_table(self, table: str) -> Dict[str, Any]:
+        # Cada hilo usa su propia conexión de solo lectura
+        with DBLite(self.db, readonly=True) as db:
+            cols = db.get_cols(table)
+            order = ", ".join(map(lambda c: f'"{c}"', cols))
+            rows = db.select(f'select * from "{table}" order by {order}')
+            tb_hash = sha256()
+            chunks: List[Dict[str, Any]] = []
+            lines: List[bytes] = []
+            for r in rows:
+                lines.append(Export.to_line(cols, r))
+                if len(lines) == self.chunk_rows:
+                    chunks.append(self.__dump(table, len(chunks), lines, tb_hash))
+                    lines = []
+            if lines or len(chunks) == 0:
+                chunks.append(self.__dump(table, len(chunks), lines, tb_hash))
+        count = sum(c["rows"] for c in chunks)
+        logger.info(f"Export: {table} = {count} filas en {len(chunks)} ficheros")
+        return {
+            "columns": list(cols),
+            "rows": count,
+            "sha256": tb_hash.hexdigest(),
+            "chunks": chunks
+        }
+
+    @staticmethod
+    def to_line(cols: tuple, row: tuple) -> bytes:
+        obj = dict(zip(cols, row))
+        line = json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=bytes.hex)
+        return (line + "\n").encode("utf-8")
+
+    def __dump(self, table: str, num: int, lines: List[bytes], tb_hash) -> Dict[str, Any]:
+        content = b"".join(lines)
+        tb_hash.update(content)
+        file = self.out.joinpath(table, f"{num:04d}.ndjson.gz")
+        FM.makedirs(file)
+        with open(file, "wb") as f:
+            with gzip.GzipFile(filename="", mode="wb", fileobj=f, mtime=0) as gz:
+                gz.write(content)
+        return {
+            "file": file.relative_to(self.out).as_posix(),
+            "rows": len(lines),
+            "sha256": sha256(content).hexdigest()
+        }
@@ -1,8 +1,13 @@
 import json
 import logging
-from os import makedirs
+import shutil
+import atexit
+import multiprocessing
+from os import makedirs, cpu_count, environ, getpid
 from os.path import dirname, realpath
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from threading import Lock, current_thread, main_thread
 import pdftotext
 import fitz
 from pytesseract import image_to_string
@@ -16,11 +21,31 @@ logger = logging.getLogger(__name__)
 re_sp = re.compile(r"\s+")
 
 
+def _init_ocr_worker():
+    # El paralelismo lo da el pool, cada tesseract usa un único hilo
+    environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _ocr_page(file: str, num: int, dpi: int = 300, lang: str = "spa") -> str:
+    # Se ejecuta en otro proceso, así que abre el pdf por su cuenta
+    with fitz.open(file) as pdf:
+        pix = pdf[num].get_pixmap(dpi=dpi)
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    return image_to_string(img, lang=lang)
+
+
 class FileManager:
     """
     Da funcionalidad de lectura (load) y escritura (dump) de ficheros
     """
+    TXT_SUFFIX = ".txt"
     OCR_SUFFIX = ".ocr.txt"
+    # Directorio donde se guarda el texto de cada página mientras dura el ocr
+    OCR_PAGES_SUFFIX = ".ocr"
+    # Procesos de ocr en total, se lean cuantos pdf se lean a la vez
+    OCR_WORKERS = max(1, cpu_count() or 1)
+    __OCR_POOL: ProcessPoolExecutor = None
+    __OCR_LOCK = Lock()
 
     def __init__(self, root=None):
         """
@@ -155,6 +180,20 @@ class FileManager:
             f.write(txt)
 
     def load_pdf(self, file, *args, **kwargs):
+        file = self.resolve_path(file)
+        if kwargs:
+            return self.__load_pdf(file, **kwargs)
+        # El texto extraído se guarda junto al pdf (.txt o .ocr.txt)
+        for suffix in (FileManager.TXT_SUFFIX, FileManager.OCR_SUFFIX):
+            file_txt = file.with_suffix(suffix)
+            if file_txt.exists():
+                return self.load_txt(file_txt)
+        all_text = self.__load_pdf(file)
+        if not file.with_suffix(FileManager.OCR_SUFFIX).exists():
+            self.dump_txt(file.with_suffix(FileManager.TXT_SUFFIX), all_text)
+        return all_text
+
+    def __load_pdf(self, file: Path, **kwargs):
         with open(file, 'rb') as fl:
             pdf = list(pdftotext.PDF(fl, **kwargs))
             all_text = "\n".join(pdf).rstrip()
@@ -170,20 +209,71 @@ class FileManager:
             reader = csv.DictReader(f, delimiter='\t')
             return tuple(reader)
 
+    @classmethod
+    def start_ocr_pool(cls):
+        """
+        Crea el pool de procesos con el que se reparte el ocr de las
+        páginas de los pdf. Se ha de llamar desde el hilo principal antes
+        de leer pdf desde varios hilos: los procesos se crean con fork y
+        se arrancan todos aquí, mientras no hay más hilos
+        """
+        with cls.__OCR_LOCK:
+            if cls.__OCR_POOL is None:
+                pool = ProcessPoolExecutor(
+                    max_workers=cls.OCR_WORKERS,
+                    mp_context=multiprocessing.get_context("fork"),
+                    initializer=_init_ocr_worker
+                )
+                for ft in [pool.submit(getpid) for _ in range(cls.OCR_WORKERS)]:
+                    ft.result()
+                cls.__OCR_POOL = pool
+                atexit.register(cls.stop_ocr_pool)
+            return cls.__OCR_POOL
+
+    @classmethod
+    def stop_ocr_pool(cls):
+        with cls.__OCR_LOCK:
+            if cls.__OCR_POOL is not None:
+                cls.__OCR_POOL.shutdown(cancel_futures=True)
+                cls.__OCR_POOL = None
+
+    @classmethod
+    def __get_ocr_pool(cls):
+        if cls.__OCR_POOL is None and current_thread() is main_thread():
+            return cls.start_ocr_pool()
+        # Desde otro hilo sin pool creado el ocr se hace en el propio hilo
+        return cls.__OCR_POOL
+
     def __load_pdf_ocr(self, file: Path):
         file_ocr = file.with_suffix(FileManager.OCR_SUFFIX)
         if file_ocr.exists():
             return self.load_txt(file_ocr)
-        pages: list[str] = []
-        pdf = fitz.open(file)
-
-        for page in pdf:
-            pix = page.get_pixmap(dpi=300)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            txt = image_to_string(img, lang="spa")
-            pages.append(txt)
-        content = "\n".join(pages)
+        dir_pages = file.with_suffix(FileManager.OCR_PAGES_SUFFIX)
+        with fitz.open(file) as pdf:
+            size = len(pdf)
+        pages: dict[int, str] = {}
+        todo: dict[int, Path] = {}
+        for num in range(size):
+            file_page = dir_pages.joinpath(f"{num:04d}.txt")
+            if file_page.exists():
+                pages[num] = self.load_txt(file_page)
+            else:
+                todo[num] = file_page
+        if todo:
+            logger.info(f"OCR {file.name}: {len(todo)}/{size} páginas")
+            pool = self.__get_ocr_pool()
+            if pool is None:
+                done = ((num, _ocr_page(str(file), num)) for num in todo)
+            else:
+                futures = {pool.submit(_ocr_page, str(file), num): num for num in todo}
+                done = ((futures[ft], ft.result()) for ft in as_completed(futures))
+            for num, txt in done:
+                pages[num] = txt
+                # Se guarda cada página según termina por si se interrumpe
+                self.dump(todo[num], txt)
+        content = "\n".join(pages[num] for num in range(size))
         self.dump_txt(file_ocr, content)
+        shutil.rmtree(dir_pages, ignore_errors=True)
         return content
 
 
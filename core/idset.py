@@ -0,0 +1,130 @@
+from array import array
+from bisect import bisect_left
+from functools import total_ordering
+from typing import Iterable, Iterator, Sequence, Union
+
+
+@total_ordering
+class IdSet(Sequence[int]):
+    """
+    Conjunto inmutable de ids de centros guardado como un array('I')
+    ordenado y sin repetidos (4 bytes por id en vez de un int de python).
+    Se recorre, indexa y ordena como la tupla ordenada de sus ids, se
+    puede crear sin copia a partir de los bytes de tobytes() y las
+    operaciones de conjuntos se hacen mezclando los dos arrays ordenados.
+    Solo es igual (y comparable) a otro IdSet.
+    """
+    __slots__ = ("__ids", "__hash")
+
+    def __init__(self, ids: Iterable[int] = tuple()):
+        if isinstance(ids, IdSet):
+            self.__ids = ids.__ids
+        else:
+            self.__ids = memoryview(array('I', sorted(set(ids))))
+        self.__hash = None
+
+    @classmethod
+    def frombytes(cls, blob: bytes) -> "IdSet":
+        obj = cls.__new__(cls)
+        obj.__ids = memoryview(blob).cast('I')
+        obj.__hash = None
+        return obj
+
+    @classmethod
+    def __from_sorted(cls, ids: array) -> "IdSet":
+        obj = cls.__new__(cls)
+        obj.__ids = memoryview(ids)
+        obj.__hash = None
+        return obj
+
+    def tobytes(self) -> bytes:
+        return self.__ids.tobytes()
+
+    def __reduce__(self):
+        # memoryview no se puede serializar, así que se guardan sus bytes
+        return (IdSet.frombytes, (self.tobytes(), ))
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.__ids)
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            return IdSet(self.__ids[i].tolist())
+        return self.__ids[i]
+
+    def __contains__(self, id: int):
+        i = bisect_left(self.__ids, id)
+        return i < len(self.__ids) and self.__ids[i] == id
+
+    def __hash__(self):
+        if self.__hash is None:
+            self.__hash = hash(self.tobytes())
+        return self.__hash
+
+    def __eq__(self, other):
+        if isinstance(other, IdSet):
+            return self.__ids == other.__ids
+        return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, IdSet):
+            return self.__ids.tolist() < other.__ids.tolist()
+        return NotImplemented
+
+    def __repr__(self):
+        return f"IdSet({self.__ids.tolist()})"
+
+    def __merge(self, other: Iterable[int], left: bool, both: bool, right: bool) -> "IdSet":
+        # left/both/right: si se quedan los ids que solo están en self,
+        # los que están en los dos y los que solo están en other
+        if not isinstance(other, IdSet):
+            other = IdSet(other)
+        a, b = self.__ids, other.__ids
+        la, lb = len(a), len(b)
+        i = j = 0
+        out = array('I')
+        while i < la and j < lb:
+            x, y = a[i], b[j]
+            if x < y:
+                if left:
+                    out.append(x)
+                i = i + 1
+            elif y < x:
+                if right:
+                    out.append(y)
+                j = j + 1
+            else:
+                if both:
+                    out.append(x)
+                i = i + 1
+                j = j + 1
+        if left and i < la:
+            out.frombytes(a[i:].tobytes())
+        if right and j < lb:
+            out.frombytes(b[j:].tobytes())
+        return IdSet.__from_sorted(out)
+
+    def union(self, *others: Iterable[int]) -> "IdSet":
+        r = self
+        for o in others:
+            r = r.__merge(o, True, True, True)
+        return r
+
+    def intersection(self, *others: Iterable[int]) -> "IdSet":
+        r = self
+        for o in others:
+            r = r.__merge(o, False, True, False)
+        return r
+
+    def difference(self, *others: Iterable[int]) -> "IdSet":
+        r = self
+        for o in others:
+            r = r.__merge(o, True, False, False)
+        return r
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
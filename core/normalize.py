@@ -0,0 +1,141 @@
+"""
+Normalización de las celdas de los csv y las fichas html de los centros.
+Son funciones puras sobre valores que se repiten mucho entre filas y
+fuentes (municipios, tipos, tlf, etc) así que se memorizan.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Sequence, Tuple
+
+from unidecode import unidecode
+
+from .util import fix_char
+from .checker import MChecker, UChecker
+
+re_sp = re.compile(r"\s+")
+re_tlf_prefix = re.compile(r"^\s*(00|\+)34\s*")
+
+CACHE_SIZE = 2**16
+
+KEYS = {
+    "CODIGO": "centro_codigo",
+    "CENTRO": "centro_nombre",
+    "COD_TIPO": "centro_tipo_codigo",
+    "TIPO_ABRV": "centro_tipo_desc_abreviada",
+    "TIPO_EXT": "centro_tipo_descripcion",
+    "TITULARIDAD": "centro_titularidad",
+    "TITULAR": "centro_titular",
+    "NIF_TITULAR": "nif_titular",
+    "NIF_CENTRO": "nif_centro",
+    "COD_DAT": "dat_codigo",
+    "DAT": "dat_nombre",
+    "CDTPVIA": "direccion_via_tipo",
+    "DOMICILIO": "direccion_via_nombre",
+    "NMVIAL": "direccion_numero",
+    "CDPOSTAL": "direccion_codigo_postal",
+    "CDMUNI": "municipio_codigo",
+    "MUNICIPIO": "municipio_nombre",
+    "CDDISTRITO": "distrito_codigo",
+    "DISTRITO": "distrito_nombre",
+    "TELEFONO": "contacto_telefono1",
+    "TELEFONO2": "contacto_telefono2",
+    "TELEFONO3": "contacto_telefono3",
+    "TELEFONO4": "contacto_telefono4",
+    "E_MAIL": "contacto_email1",
+    "E_MAIL2": "contacto_email2",
+    "SITUACIÓN": "situacion",
+    "FAX": "contacto_fax",
+    "WEB": "contacto_web",
+    "FECHA CONSTITUCIÓN": "fecha_constitucion",
+    "UTM_X": "direccion_coor_x",
+    "UTM_Y": "direccion_coor_y",
+}
+
+INT_KEYS = frozenset({
+    'centro_codigo',
+    'centro_tipo_codigo',
+    'dat_codigo',
+    'direccion_codigo_postal',
+    'distrito_codigo',
+    'direccion_coor_x',
+    'direccion_coor_y',
+    'CODIGO CENTRO',
+    'COD. POSTAL'
+})
+
+NULL_VALUES = frozenset({"", "0", "http://", "https://", "http://no"})
+NULL_FAX = frozenset({"sinfax", "nohayfax", "no", "x"})
+
+ETAPA_TD = {
+    "Clav e": "Clave"
+}
+
+
+@lru_cache(maxsize=None)
+def parse_key(k: str) -> str:
+    key = KEYS.get(k)
+    if key is not None:
+        return key
+    return unidecode(k).lower()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_value(k: str, v: str):
+    if v is None:
+        return None
+    v = re_sp.sub(" ", v).strip()
+    lw = v.lower()
+    if lw in NULL_VALUES or len(lw.strip("-")) == 0:
+        return None
+    if k == 'FAX' and lw in NULL_FAX:
+        return None
+    if k in INT_KEYS:
+        return int(v)
+    return fix_char(v)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_telefono(s: str) -> Tuple[int]:
+    if s is None:
+        return tuple()
+    s = s.replace(".", "")
+    s = re_tlf_prefix.sub("", s)
+    arr = []
+    for t in s.split():
+        if len(t) > 8 and t.isdigit():
+            arr.append(int(t))
+    return tuple(arr)
+
+
+def parse_etapa_td(txt: str):
+    if txt is None:
+        return None
+    return ETAPA_TD.get(txt, txt)
+
+
+class BatchNormalizer:
+    """
+    Aplica una normalización a columnas enteras de un csv: cada valor
+    (o combinación de valores si son varias columnas) distinto se
+    normaliza una sola vez por lote. Lo memorizado se descarta al
+    acabar el lote para no crecer sin límite
+    """
+
+    def __init__(self, func: Callable[..., Any]):
+        self.func = func
+
+    def map(self, *columns: Iterable) -> Tuple:
+        done: Dict[Tuple, Any] = {}
+        arr = []
+        for args in zip(*columns):
+            if args not in done:
+                done[args] = self.func(*args)
+            arr.append(done[args])
+        return tuple(arr)
+
+    def column(self, rows: Sequence[Dict[str, Any]], *keys: str) -> Tuple:
+        return self.map(*(tuple(r[k] for r in rows) for k in keys))
+
+
+find_email = BatchNormalizer(MChecker.find_email)
+find_urls = BatchNormalizer(UChecker.find_urls)
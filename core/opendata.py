@@ -12,7 +12,7 @@ from core.util import mk_dict_1_1, mk_dict_n_1
 from types import UnionType, MappingProxyType
 import typing
 from functools import cached_property, cache
-from core.checker import MChecker, UChecker
+from core.normalize import BatchNormalizer, find_email, find_urls
 from time import sleep
 
 
@@ -181,6 +181,9 @@ def _tlf(*args: str | None):
     return tuple(dict.fromkeys(arr))
 
 
+tlf = BatchNormalizer(_tlf)
+
+
 def _tipo(s: str | None):
     if s is None:
         return None
@@ -442,7 +445,12 @@ class OpenData():
 
     def get_cam_centros(self):
         centros: set[CamCentro] = set()
-        for r in self.__read_csv("cam_centros.csv", OpenData.CAM_CENTROS):
+        rows = self.__read_csv("cam_centros.csv", OpenData.CAM_CENTROS)
+        telefono = tlf.column(rows, 'TELEFONO', 'TELEFONO2', 'TELEFONO3', 'TELEFONO4')
+        fax = tlf.column(rows, 'FAX')
+        web = find_urls.column(rows, 'WEB')
+        email = find_email.column(rows, 'WEB', 'E_MAIL', 'E_MAIL2')
+        for i, r in enumerate(rows):
             c = CamCentro(
                 codigo=int(r['CODIGO']),
                 centro=r['CENTRO'],
@@ -469,10 +477,10 @@ class OpenData():
                     cod=r['CDDISTRITO'],
                     txt=r['DISTRITO']
                 ),
-                telefono=_tlf(r['TELEFONO'], r['TELEFONO2'], r['TELEFONO3'], r['TELEFONO4']),
-                fax=_tlf(r['FAX']),
-                web=UChecker.find_urls(r['WEB']),
-                email=MChecker.find_email(r['WEB'], r['E_MAIL'], r['E_MAIL2']),
+                telefono=telefono[i],
+                fax=fax[i],
+                web=web[i],
+                email=email[i],
                 latlon=get_latlon(
                     _number(r['UTM_X']),
                     _number(r['UTM_Y'])
@@ -492,7 +500,7 @@ class OpenData():
     @cache
     def get_mun_centros(self):
         centros: set[MunCentro] = set()
-        for r in _join(
+        rows = _join(
             "num_*.csv",
             self.__read_csv("mun_centros.csv", OpenData.MUN_CENTROS, encoding="windows-1250"),
             self.__read_csv("mun_artes.csv", OpenData.MUN_ARTES, encoding="windows-1250"),
@@ -502,7 +510,11 @@ class OpenData():
             self.__read_csv("mun_accesible.csv", OpenData.MUN_ACCESIBLE, encoding="windows-1250"),
             self.__read_csv("no_mun_accesible.csv", OpenData.NO_MUN_ACCESIBLE, encoding="windows-1250"),
             pk='PK'
-        ):
+        )
+        telefono = tlf.column(rows, 'TELEFONO')
+        fax = tlf.column(rows, 'FAX')
+        email = find_email.column(rows, 'EMAIL')
+        for i, r in enumerate(rows):
             tipo = _tipo(r['TIPO'])
             c = MunCentro(
                 pk=_number(r['PK']),
@@ -540,9 +552,9 @@ class OpenData():
                     _number(r['COORDENADA-X']),
                     _number(r['COORDENADA-Y'])
                 ),
-                telefono=_tlf(r['TELEFONO']),
-                fax=_tlf(r['FAX']),
-                email=MChecker.find_email(r['EMAIL']),
+                telefono=telefono[i],
+                fax=fax[i],
+                email=email[i],
                 tipo=tipo,
             )
             centros.add(c)
@@ -0,0 +1,141 @@
+import sqlite3
+import logging
+import errno
+import os
+from os.path import isfile
+from queue import LifoQueue, Empty
+from urllib.parse import quote
+from threading import Lock
+from contextlib import contextmanager
+from typing import Callable, Iterator, Any
+
+logger = logging.getLogger(__name__)
+
+
+class ReadPool:
+    """
+    Pool de conexiones de solo lectura a una db sqlite que se puede usar
+    desde varios hilos a la vez (cada consulta toma una conexión libre
+    y la devuelve al terminar).
+    Cada conexión guarda sus sentencias preparadas (cached_statements)
+    y el row_factory se aplica al cursor, no a la conexión.
+    """
+
+    def __init__(
+            self,
+            file: str,
+            size: int = 4,
+            mmap_size: int = 256 * 1024 * 1024,
+            cache_size: int = -64 * 1024,
+            cached_statements: int = 256,
+            timeout: float = 60
+    ):
+        if not isfile(file):
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), file)
+        self.file = file
+        self.size = size
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self.__free: LifoQueue[sqlite3.Connection] = LifoQueue()
+        self.__all: list[sqlite3.Connection] = []
+        self.__lock = Lock()
+
+    def __enter__(self, *args, **kwargs):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def __connect(self):
+        logger.debug(f"ReadPool({self.file}) conexión {len(self.__all)+1}/{self.size}")
+        con = sqlite3.connect(
+            f"file:{quote(self.file)}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        con.execute("pragma query_only = 1")
+        con.execute(f"pragma mmap_size = {int(self.mmap_size)}")
+        con.execute(f"pragma cache_size = {int(self.cache_size)}")
+        return con
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        con = None
+        try:
+            con = self.__free.get_nowait()
+        except Empty:
+            with self.__lock:
+                if len(self.__all) < self.size:
+                    con = self.__connect()
+                    self.__all.append(con)
+        if con is None:
+            try:
+                con = self.__free.get(timeout=self.timeout)
+            except Empty:
+                raise TimeoutError(f"ReadPool({self.file}): ninguna conexión libre en {self.timeout}s") from None
+        try:
+            yield con
+        finally:
+            self.__free.put(con)
+
+    def select(self, sql: str, *args, row_factory: Callable = None) -> Iterator[Any]:
+        # Las filas se leen enteras y la conexión se devuelve antes de
+        # recorrerlas, así un iterador a medias no deja la conexión cogida
+        with self.connection() as con:
+            cursor = con.cursor()
+            cursor.row_factory = row_factory
+            try:
+                rows = cursor.execute(sql, args).fetchall()
+            finally:
+                cursor.close()
+        return iter(rows)
+
+    def iter_select(self, sql: str, *args, row_factory: Callable = None, size: int = 1000) -> Iterator[Any]:
+        """
+        Como select pero va leyendo las filas de size en size mientras
+        se recorren. La conexión queda cogida hasta que se termina (o se
+        cierra) el generador, así que conviene recorrerlo entero o usarlo
+        con contextlib.closing
+        """
+        with self.connection() as con:
+            cursor = con.cursor()
+            cursor.row_factory = row_factory
+            try:
+                cursor.execute(sql, args)
+                while True:
+                    rows = cursor.fetchmany(size)
+                    if not rows:
+                        return
+                    yield from rows
+            finally:
+                cursor.close()
+
+    def to_tuple(self, sql: str, *args, **kwargs):
+        arr = []
+        for i in self.select(sql, *args, **kwargs):
+            if isinstance(i, (tuple, list)) and len(i) == 1:
+                i = i[0]
+            arr.append(i)
+        return tuple(arr)
+
+    def one(self, sql: str, *args, row_factory: Callable = None):
+        with self.connection() as con:
+            cursor = con.cursor()
+            cursor.row_factory = row_factory
+            try:
+                r = cursor.execute(sql, args).fetchone()
+            finally:
+                cursor.close()
+        if isinstance(r, (tuple, list)) and len(r) == 1:
+            return r[0]
+        return r
+
+    def close(self):
+        with self.__lock:
+            for con in self.__all:
+                con.close()
+            self.__all = []
+            self.__free = LifoQueue()
@@ -1,4 +1,5 @@
 from typing import NamedTuple, Tuple
+from .idset import IdSet
 
 
 class ParamValueText(NamedTuple):
@@ -11,15 +12,15 @@ class QueryCentros(NamedTuple):
     id: str
     qr: str
     txt: str
-    centros: Tuple[int]
+    centros: IdSet
 
 
 class QueryResponse(NamedTuple):
     codCentrosExp: str
     frmExportarResultado: str
 
-    def get_ids(self):
+    def get_ids(self) -> IdSet:
         if len(self.codCentrosExp) == 0:
-            return tuple()
+            return IdSet()
         ids = self.codCentrosExp.split(";")
-        return tuple(sorted(map(int, ids)))
+        return IdSet(map(int, ids))
@@ -1,5 +1,6 @@
 from hashlib import sha1
-from typing import Union, Tuple, Any
+from typing import Union, Tuple, Any, Iterable, Set
+from bisect import bisect_left
 import functools
 import logging
 import re
@@ -16,6 +17,14 @@ def hashme(s):
     return sha1(str(s).encode("utf-8")).hexdigest()
 
 
+def hashfile(file, size: int = 1024 * 1024):
+    h = sha1()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
 def must_one(arr, log_prefix=None):
     arr = set(arr)
     msg = f"{log_prefix or ''} Must one but is".strip()
@@ -72,6 +81,21 @@ def fix_char(txt: str):
     return txt
 
 
+def get_leaves(items: Iterable[str], sep: str) -> Set[str]:
+    """
+    Devuelve los elementos que no tienen descendientes, es decir,
+    los x tal que ningún otro elemento empieza por x+sep
+    """
+    items = sorted(set(items))
+    leaves = set()
+    for x in items:
+        prefix = x + sep
+        i = bisect_left(items, prefix)
+        if i == len(items) or not items[i].startswith(prefix):
+            leaves.add(x)
+    return leaves
+
+
 def logme(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
@@ -29,12 +29,13 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.remote.webelement import WebElement
 import logging
-from typing import Union
+from typing import Union, Tuple
 
 logger = logging.getLogger(__name__)
 
 re_sp = re.compile(r"\s+")
 re_emb = re.compile(r"^image/[^;]+;base64,.*", re.IGNORECASE)
+URL_TAGS = ("img", "form", "a", "iframe", "frame", "link", "script", "input")
 is_s5h = os.environ.get('http_proxy', "").startswith("socks5h://")
 if is_s5h:
     proxy_ip, proxy_port = os.environ['http_proxy'].split(
@@ -72,13 +73,22 @@ def get_query(url):
     return q
 
 
-def iterhref(soup: BeautifulSoup):
-    """Recorre los atributos href o src de los tags"""
+def iterhref(soup: BeautifulSoup, select: Tuple[str, ...] = None):
+    """
+    Recorre los atributos href o src de los tags
+    Si se pasa select solo se recorren los nodos que cumplen esos selectores
+    """
     n: Tag
-    for n in soup.findAll(["img", "form", "a", "iframe", "frame", "link", "script", "input"]):
-        attr = "href" if n.name in ("a", "link") else "src"
-        if n.name == "form":
-            attr = "action"
+    if select is None:
+        nodes = soup.findAll(URL_TAGS)
+    elif len(select) == 0:
+        return
+    else:
+        nodes = soup.select(",".join(select))
+    for n in nodes:
+        if n.name not in URL_TAGS:
+            continue
+        attr = get_url_attr(n)
         val = n.attrs.get(attr)
         if val is None or re_emb.search(val):
             continue
@@ -86,9 +96,23 @@ def iterhref(soup: BeautifulSoup):
             yield n, attr, val
 
 
-def buildSoup(root: str, source: str, parser="lxml"):
+def get_url_attr(n: Tag):
+    if n.name in ("a", "link"):
+        return "href"
+    if n.name == "form":
+        return "action"
+    return "src"
+
+
+def buildSoup(root: str, source: str, parser="lxml", urls: Tuple[str, ...] = None):
+    """
+    Crea la sopa resolviendo las urls relativas respecto a root.
+    urls=None resuelve todas las urls del documento, en otro caso solo
+    las de los nodos que cumplen alguno de los selectores dados
+    (una tupla vacía no resuelve ninguna)
+    """
     soup = BeautifulSoup(source, parser)
-    for n, attr, val in iterhref(soup):
+    for n, attr, val in iterhref(soup, select=urls):
         val = urljoin(root, val)
         n.attrs[attr] = val
     return soup
@@ -137,12 +161,12 @@ class Web:
             return self.s.post(url, data=kwargs, allow_redirects=allow_redirects, verify=self.verify, auth=auth)
         return self.s.get(url, allow_redirects=allow_redirects, verify=self.verify, auth=auth)
 
-    def get(self, url, auth=None, parser="lxml", **kwargs):
+    def get(self, url, auth=None, parser="lxml", urls: Tuple[str, ...] = None, **kwargs):
         if self.refer:
             self.s.headers.update({'referer': self.refer})
         self.response = self._get(url, auth=auth, **kwargs)
         self.refer = self.response.url
-        self.soup = buildSoup(url, self.response.content, parser=parser)
+        self.soup = buildSoup(url, self.response.content, parser=parser, urls=urls)
         return self.soup
 
     def prepare_submit(self, slc, silent_in_fail=False, **kwargs):
@@ -17,6 +17,9 @@ parser.add_argument(
 parser.add_argument(
     '--busquedas', action='store_true', help="Descarga el resultado de las busquedas"
 )
+parser.add_argument(
+    '--refresh', action='store_true', help="Vuelve a descargar las fichas antiguas (las que no cambian solo se marcan como comprobadas)"
+)
 
 open("dwn.log", "w").close()
 logging.basicConfig(
@@ -34,13 +37,13 @@ ARG.todo = not (ARG.centros or ARG.busquedas)
 API = Api()
 
 
-def dwn_html(tcp_limit: int = 10):
+def dwn_html(tcp_limit: int = 10, refresh: bool = False):
     BulkRequests(
         tcp_limit=tcp_limit,
         tries=10,
         tolerance=5
     ).run(*(
-        BulkRequestsCentro(c.id) for c in API.search_centros()
+        BulkRequestsCentro(c.id, refresh=refresh) for c in API.search_centros()
     ), label="centros")
 
 
@@ -66,7 +69,7 @@ def dwn_search(tcp_limit: int = 10):
 
 
 if ARG.todo or ARG.centros:
-    dwn_html(tcp_limit=ARG.tcp_limit)
+    dwn_html(tcp_limit=ARG.tcp_limit, refresh=ARG.refresh)
 
 if ARG.todo or ARG.busquedas:
     dwn_search(tcp_limit=ARG.tcp_limit)
\ No newline at end of file
@@ -0,0 +1,35 @@
+from core.export import Export
+import argparse
+import logging
+
+parser = argparse.ArgumentParser(
+    description='Exporta cada tabla de la db a ndjson.gz con un manifest.json',
+)
+parser.add_argument(
+    '--db', type=str, default="out/db.sqlite"
+)
+parser.add_argument(
+    '--out', type=str, default="out/export"
+)
+parser.add_argument(
+    '--chunk-rows', type=int, default=50000
+)
+parser.add_argument(
+    '--workers', type=int, default=4
+)
+
+ARG = parser.parse_args()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(name)s - %(levelname)s - %(message)s',
+    datefmt='%d-%m-%Y %H:%M:%S'
+)
+
+if __name__ == "__main__":
+    Export(
+        ARG.db,
+        out=ARG.out,
+        chunk_rows=ARG.chunk_rows,
+        workers=ARG.workers
+    ).run()
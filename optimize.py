@@ -0,0 +1,25 @@
+from core.dblite import DBLite
+import argparse
+import logging
+
+parser = argparse.ArgumentParser(
+    description='Comprueba la db y la compacta (VACUUM), una sola vez al final',
+)
+parser.add_argument(
+    '--db', type=str, default="out/db.sqlite"
+)
+parser.add_argument(
+    '--check', type=str, choices=DBLite.CHECKS, default="full"
+)
+
+ARG = parser.parse_args()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(name)s - %(levelname)s - %(message)s',
+    datefmt='%d-%m-%Y %H:%M:%S'
+)
+
+if __name__ == "__main__":
+    with DBLite(ARG.db, check=ARG.check) as db:
+        db.optimize()
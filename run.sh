@@ -6,4 +6,6 @@ python3 dwn.py
 python3 build.py
 python3 readme.py
 cp out/db.sqlite out/db.bak.sqlite
-python3 concurso.py
\ No newline at end of file
+python3 concurso.py
+python3 optimize.py
+python3 export.py
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+Compara el parseo del csv de gestiona contra la implementación anterior
+basada en expresiones regulares
+
+Uso: python -m scripts.bench_csv [cache/csv/all.csv]
+"""
+import re
+import sys
+from timeit import timeit
+from itertools import zip_longest
+from typing import Tuple
+
+from core.api import iter_csv_rows
+from core.centro import Centro, _find_titularidad
+from core.checker import MChecker
+from core.filemanager import FM
+from core.util import fix_char
+
+re_csv_br = re.compile(r"\s*\n\s*")
+re_csv_fl = re.compile(r"\s*;\s*")
+re_sp = re.compile(r"\s+")
+
+
+def old_csvstr_to_rows(content: str):
+    rows = []
+    for row in re_csv_br.split(content.strip()):
+        row = row.rstrip(" ;,-")
+        if len(row) > 0:
+            rows.append(tuple(re_csv_fl.split(row)))
+    return tuple(rows)
+
+
+def _parse(k: str, v: str):
+    if v is None:
+        return None
+    v = re_sp.sub(" ", v).strip()
+    lw = v.lower()
+    if lw.lower() in ("", "0", "http://", "https://", "http://no") or re.match(r"^-+$", lw):
+        return None
+    if k == 'FAX' and lw in ("sinfax", "nohayfax", "no", "x"):
+        return None
+    if k in ('centro_codigo', 'centro_tipo_codigo', 'dat_codigo', 'direccion_codigo_postal', 'distrito_codigo', 'direccion_coor_x', 'direccion_coor_y', 'CODIGO CENTRO', 'COD. POSTAL'):
+        return int(v)
+    if isinstance(v, str):
+        v = fix_char(v)
+    return v
+
+
+def _get_telefono(s: str) -> Tuple[int]:
+    if s is None:
+        return tuple()
+    s = s.replace(".", "")
+    s = re.sub(r"^\s*(00|\+)34\s*", "", s)
+    s = re_sp.sub(" ", s).strip()
+    arr = []
+    for t in s.split():
+        if len(t) > 8 and t not in arr and t.isdigit():
+            arr.append(int(t))
+    return tuple(arr)
+
+
+def old_build(head: tuple, row: tuple):
+    obj = {h: _parse(h, c) for h, c in zip_longest(head, row)}
+    return Centro(
+        area=obj['AREA TERRITORIAL'],
+        id=obj['CODIGO CENTRO'],
+        tipo=obj['TIPO DE CENTRO'],
+        nombre=obj['CENTRO'],
+        domicilio=obj['DOMICILIO'],
+        municipio=obj['MUNICIPIO'],
+        distrito=obj['DISTRITO MUNICIPAL'],
+        cp=obj['COD. POSTAL'],
+        telefono=_get_telefono(obj['TELEFONO']),
+        email=MChecker.find_email(*row[head.index("EMAIL"):]),
+        titularidad=_find_titularidad(row[head.index("EMAIL2")+1:]),
+        fax=_get_telefono(obj['FAX']),
+    )
+
+
+def old_parse(file: str):
+    rows = old_csvstr_to_rows(FM.load_txt(FM.resolve_path(file)))
+    head = rows[1]
+    return tuple(old_build(head, r) for r in rows[2:])
+
+
+def new_parse(file: str):
+    with open(FM.resolve_path(file), "r") as f:
+        rows = iter_csv_rows(f)
+        next(rows)
+        head = next(rows)
+        return tuple(Centro.iter_build(head, rows))
+
+
+if __name__ == "__main__":
+    file = (sys.argv[1:] or ["cache/csv/all.csv"])[0]
+    old, new = old_parse(file), new_parse(file)
+    if old != new:
+        raise ValueError("Los centros obtenidos no coinciden")
+    number = 5
+    t_old = timeit(lambda: old_parse(file), number=number) / number
+    t_new = timeit(lambda: new_parse(file), number=number) / number
+    print(f"{len(new)} centros")
+    print(f"regex:   {t_old:.4f}s")
+    print(f"1 pasada: {t_new:.4f}s ({t_old/t_new:.2f}x)")
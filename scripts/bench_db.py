@@ -0,0 +1,61 @@
+"""
+Mide las consultas más habituales sobre la db con y sin los índices
+de sql/index.sql (las dos copias se hacen en memoria)
+
+Uso: python -m scripts.bench_db [out/db.sqlite]
+"""
+import sqlite3
+import sys
+from timeit import timeit
+
+from core.filemanager import FM
+
+QUERIES = {
+    "CENTRO por tipo": ("select id from CENTRO where tipo=?", "select tipo from CENTRO"),
+    "CENTRO por municipio": ("select id from CENTRO where municipio=?", "select municipio from CENTRO"),
+    "CENTRO por cp": ("select id from CENTRO where cp=?", "select cp from CENTRO"),
+    "CENTRO por distrito": ("select id from CENTRO where distrito=?", "select distrito from CENTRO"),
+    "CENTRO por area": ("select id from CENTRO where area=?", "select area from CENTRO"),
+    "QUERY_CENTRO por query": ("select centro from QUERY_CENTRO where query=?", "select query from QUERY_CENTRO"),
+    "ETAPA_CENTRO por etapa": ("select centro from ETAPA_CENTRO where etapa=?", "select etapa from ETAPA_CENTRO"),
+    "CONCURSO_ANEXO_CENTRO por concurso": ("select centro from CONCURSO_ANEXO_CENTRO where concurso=?", "select concurso from CONCURSO_ANEXO_CENTRO"),
+    "CONCURSO_ANEXO_CENTRO por centro": ("select concurso, anexo from CONCURSO_ANEXO_CENTRO where centro=?", "select centro from CONCURSO_ANEXO_CENTRO"),
+}
+
+
+def load(file: str, indexes: bool):
+    con = sqlite3.connect(":memory:")
+    src = sqlite3.connect(f"file:{FM.resolve_path(file)}?mode=ro", uri=True)
+    src.backup(con)
+    src.close()
+    for (name, ) in con.execute("select name from sqlite_master where type='index' and name like 'ix_%'").fetchall():
+        con.execute(f"DROP INDEX {name}")
+    con.execute("DROP TABLE IF EXISTS sqlite_stat1")
+    if indexes:
+        con.executescript(FM.load_txt(FM.resolve_path("sql/index.sql")))
+    return con
+
+
+def params(con: sqlite3.Connection, sql: str):
+    return tuple(sorted(set(r[0] for r in con.execute(sql) if r[0] is not None)))
+
+
+def bench(con: sqlite3.Connection, sql: str, prms: tuple):
+    def run():
+        for p in prms:
+            con.execute(sql, (p, )).fetchall()
+    return timeit(run, number=5) / 5
+
+
+if __name__ == "__main__":
+    file = (sys.argv[1:] or ["out/db.sqlite"])[0]
+    without, withix = load(file, False), load(file, True)
+    for label, (sql, sql_params) in QUERIES.items():
+        prms = params(without, sql_params)
+        if len(prms) == 0:
+            continue
+        t_old = bench(without, sql, prms)
+        t_new = bench(withix, sql, prms)
+        print(f"{label} ({len(prms)} valores)")
+        print(f"  sin índices: {t_old:.4f}s")
+        print(f"  con índices: {t_new:.4f}s ({t_old/max(t_new, 1e-9):.2f}x)")
@@ -0,0 +1,51 @@
+"""
+Mide con tracemalloc el pico de memoria de build_db sobre una db en memoria
+(usa las caches de cache/, así que conviene lanzarlo después de un build)
+
+Uso: python -m scripts.bench_mem [--top N] [--max-mb MB] [--tcp-limit N]
+
+Con --max-mb termina con error si el pico supera ese valor
+"""
+import argparse
+import sys
+import tracemalloc
+from time import time
+
+parser = argparse.ArgumentParser(
+    description='Pico de memoria de build_db',
+)
+parser.add_argument(
+    '--top', type=int, default=10
+)
+parser.add_argument(
+    '--max-mb', type=float, default=None
+)
+ARG, rest = parser.parse_known_args()
+# El resto de argumentos los lee build.py al importarlo
+sys.argv = sys.argv[:1] + rest
+
+tracemalloc.start()
+
+import build  # noqa: E402
+from core.dblite import DBLite  # noqa: E402
+
+
+def to_mb(size: int):
+    return size / (1024 * 1024)
+
+
+if __name__ == "__main__":
+    tracemalloc.reset_peak()
+    start = time()
+    with DBLite(":memory:") as db:
+        build.build_db(db, build.ARG.tcp_limit)
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    print(f"build_db: {time()-start:.1f}s")
+    print(f"  memoria al terminar: {to_mb(current):.1f} MB")
+    print(f"  pico de memoria:     {to_mb(peak):.1f} MB")
+    for stat in snapshot.statistics("lineno")[:ARG.top]:
+        print(f"  {to_mb(stat.size):8.2f} MB {stat.traceback}")
+    if ARG.max_mb is not None and to_mb(peak) > ARG.max_mb:
+        sys.exit(f"El pico de memoria ({to_mb(peak):.1f} MB) supera {ARG.max_mb} MB")
@@ -0,0 +1,214 @@
+"""
+Compara las funciones de core.normalize contra la implementación anterior
+(regex y cadenas de if en cada llamada) sobre los csv y las fichas html
+que haya en cache/
+
+Uso: python -m scripts.bench_normalize [cache/csv/all.csv] [cache/csv/opendata.csv] [cache/html/]
+"""
+import re
+import sys
+from glob import glob
+from timeit import timeit
+from unidecode import unidecode
+
+from bs4 import BeautifulSoup
+
+from core.api import iter_csv_rows
+from core.centro import Etapa, get_text
+from core.filemanager import FM
+from core.normalize import parse_key, parse_value, parse_telefono, parse_etapa_td
+from core.util import fix_char
+
+re_sp = re.compile(r"\s+")
+
+
+def old_parse_k(k: str):
+    if k == "CODIGO":
+        return "centro_codigo"
+    if k == "CENTRO":
+        return "centro_nombre"
+    if k == "COD_TIPO":
+        return "centro_tipo_codigo"
+    if k == "TIPO_ABRV":
+        return "centro_tipo_desc_abreviada"
+    if k == "TIPO_EXT":
+        return "centro_tipo_descripcion"
+    if k == "TITULARIDAD":
+        return "centro_titularidad"
+    if k == "TITULAR":
+        return "centro_titular"
+    if k == "NIF_TITULAR":
+        return "nif_titular"
+    if k == "NIF_CENTRO":
+        return "nif_centro"
+    if k == "COD_DAT":
+        return "dat_codigo"
+    if k == "DAT":
+        return "dat_nombre"
+    if k == "CDTPVIA":
+        return "direccion_via_tipo"
+    if k == "DOMICILIO":
+        return "direccion_via_nombre"
+    if k == "NMVIAL":
+        return "direccion_numero"
+    if k == "CDPOSTAL":
+        return "direccion_codigo_postal"
+    if k == "CDMUNI":
+        return "municipio_codigo"
+    if k == "MUNICIPIO":
+        return "municipio_nombre"
+    if k == "CDDISTRITO":
+        return "distrito_codigo"
+    if k == "DISTRITO":
+        return "distrito_nombre"
+    if k == "TELEFONO":
+        return "contacto_telefono1"
+    if k == "TELEFONO2":
+        return "contacto_telefono2"
+    if k == "TELEFONO3":
+        return "contacto_telefono3"
+    if k == "TELEFONO4":
+        return "contacto_telefono4"
+    if k == "E_MAIL":
+        return "contacto_email1"
+    if k == "E_MAIL2":
+        return "contacto_email2"
+    if k == "SITUACIÓN":
+        return "situacion"
+    if k == "FAX":
+        return "contacto_fax"
+    if k == "WEB":
+        return "contacto_web"
+    if k == "FECHA CONSTITUCIÓN":
+        return "fecha_constitucion"
+    if k == "UTM_X":
+        return "direccion_coor_x"
+    if k == "UTM_Y":
+        return "direccion_coor_y"
+    k = unidecode(k).lower()
+    return k
+
+
+def old_parse(k: str, v: str):
+    if v is None:
+        return None
+    v = re_sp.sub(" ", v).strip()
+    lw = v.lower()
+    if lw.lower() in ("", "0", "http://", "https://", "http://no") or re.match(r"^-+$", lw):
+        return None
+    if k == 'FAX' and lw in ("sinfax", "nohayfax", "no", "x"):
+        return None
+    if k in ('centro_codigo', 'centro_tipo_codigo', 'dat_codigo', 'direccion_codigo_postal', 'distrito_codigo', 'direccion_coor_x', 'direccion_coor_y', 'CODIGO CENTRO', 'COD. POSTAL'):
+        return int(v)
+    if isinstance(v, str):
+        v = fix_char(v)
+    return v
+
+
+def old_get_telefono(s: str):
+    if s is None:
+        return tuple()
+    s = s.replace(".", "")
+    s = re.sub(r"^\s*(00|\+)34\s*", "", s)
+    s = re_sp.sub(" ", s).strip()
+    arr = []
+    for t in s.split():
+        if len(t) > 8 and t not in arr and t.isdigit():
+            arr.append(int(t))
+    return tuple(arr)
+
+
+def old_etapa_td(txt: str):
+    if txt is None:
+        return None
+    return {
+        "Clav e": "Clave"
+    }.get(txt, txt)
+
+
+def old_notnull(e: Etapa):
+    return Etapa(**{
+        **e._asdict(),
+        **dict(
+            nombre=(e.nombre or ''),
+            titularidad=(e.titularidad or ''),
+            tipo=(e.tipo or ''),
+            plazas=(e.plazas or ''),
+            nivel=(e.nivel or -1),
+        )
+    })
+
+
+def load_csv(file: str, skip: int):
+    with open(FM.resolve_path(file), "r", encoding="utf-8", errors="replace") as f:
+        rows = iter_csv_rows(f)
+        for _ in range(skip):
+            next(rows, None)
+        head = next(rows, None)
+        return head, tuple(rows)
+
+
+def load_td(path: str):
+    txt = []
+    for file in sorted(glob(FM.resolve_path(path).joinpath("*.html").as_posix())):
+        soup = BeautifulSoup(FM.load_txt(file), "lxml")
+        for td in soup.select("#capaEtapasContent td"):
+            txt.append(get_text(td))
+    return tuple(txt)
+
+
+def bench(label: str, size: int, old, new, number: int = 5):
+    def cold_new():
+        # Cada pasada empieza con las funciones memorizadas vacías
+        for f in (parse_key, parse_value, parse_telefono):
+            f.cache_clear()
+        return new()
+
+    if old() != cold_new():
+        raise ValueError(f"{label}: los resultados no coinciden")
+    t_old = timeit(old, number=number) / number
+    t_new = timeit(cold_new, number=number) / number
+    size = max(size, 1)
+    print(f"{label} ({size} valores)")
+    print(f"  anterior: {t_old/size*1e6:.3f}µs/valor")
+    print(f"  actual:   {t_new/size*1e6:.3f}µs/valor ({t_old/max(t_new, 1e-9):.2f}x)")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:] + ["cache/csv/all.csv", "cache/csv/opendata.csv", "cache/html/"][len(sys.argv[1:]):]
+    all_csv, opendata_csv, html = args
+
+    head, rows = load_csv(all_csv, 1)
+    cells = tuple((h, c) for r in rows for h, c in zip(head, r))
+    bench(
+        "parse_value (gestiona)", len(cells),
+        lambda: [old_parse(h, c) for h, c in cells],
+        lambda: [parse_value(h, c) for h, c in cells]
+    )
+    tlfs = tuple(r[head.index(k)] for r in rows for k in ("TELEFONO", "FAX") if head.index(k) < len(r))
+    bench(
+        "parse_telefono (gestiona)", len(tlfs),
+        lambda: [old_get_telefono(t) for t in tlfs],
+        lambda: [parse_telefono(t) for t in tlfs]
+    )
+
+    head, rows = load_csv(opendata_csv, 0)
+    cells = tuple((h, c) for r in rows for h, c in zip(head, r))
+    bench(
+        "parse_key + parse_value (opendata)", len(cells),
+        lambda: [old_parse(old_parse_k(h), c) for h, c in cells],
+        lambda: [parse_value(parse_key(h), c) for h, c in cells]
+    )
+
+    tds = load_td(html)
+    bench(
+        "get_etapa_td (html)", len(tds),
+        lambda: [old_etapa_td(t) for t in tds],
+        lambda: [parse_etapa_td(t) for t in tds]
+    )
+    etapas = tuple(Etapa(*tds[i:i+4], i % 3 or None) for i in range(0, len(tds)-3, 4))
+    bench(
+        "Etapa.notnull (html)", len(etapas),
+        lambda: [old_notnull(e) for e in etapas],
+        lambda: [e.notnull() for e in etapas]
+    )
@@ -1,9 +1,9 @@
-import sqlite3
 from os.path import isfile
 from urllib.request import urlretrieve
 from functools import cache
 import re
 from core.filemanager import FM
+from core.query import ReadPool
 from requests import Session
 from typing import NamedTuple
 from textwrap import dedent
@@ -50,19 +50,11 @@ def get_db():
     out = "/tmp/centros_db.sqlite"
     if not isfile(out):
         urlretrieve("https://s-nt-s.github.io/centros/db.sqlite", out)
-    con = sqlite3.connect(out, uri=True)
-    return con
+    return ReadPool(out)
 
 
 def select(sql: str, *args):
-    cursor = get_db().cursor()
-    if len(args):
-        cursor.execute(sql, args)
-    else:
-        cursor.execute(sql)
-    for r in cursor.fetchall():
-        yield r
-    cursor.close()
+    return get_db().select(sql, *args)
 
 
 URLS: dict[str, int] = {}
@@ -0,0 +1,11 @@
+-- Índices que se crean después de la carga masiva (ver build.create_indexes)
+CREATE INDEX IF NOT EXISTS ix_centro_tipo ON CENTRO(tipo);
+CREATE INDEX IF NOT EXISTS ix_centro_municipio ON CENTRO(municipio);
+CREATE INDEX IF NOT EXISTS ix_centro_cp ON CENTRO(cp);
+CREATE INDEX IF NOT EXISTS ix_centro_distrito ON CENTRO(distrito);
+CREATE INDEX IF NOT EXISTS ix_centro_area ON CENTRO(area);
+CREATE INDEX IF NOT EXISTS ix_query_centro_query ON QUERY_CENTRO(query, centro);
+CREATE INDEX IF NOT EXISTS ix_etapa_centro_etapa ON ETAPA_CENTRO(etapa, centro);
+CREATE INDEX IF NOT EXISTS ix_concurso_anexo_centro_concurso ON CONCURSO_ANEXO_CENTRO(concurso, anexo, centro);
+ANALYZE;
+PRAGMA optimize;